@@ -0,0 +1,174 @@
+"""End-to-end throughput benchmark against the fake Bronto service.
+
+Starts benchmarks.fake_bronto on a local port, runs tap-bronto's
+discovery and then a full sync of the chosen streams in a subprocess,
+and reports records/sec, the sync's peak RSS, and the API calls each
+stream made.
+
+    python -m benchmarks.end_to_end [--hours 24] [--streams contact,list]
+        [--latency 0.05] [--config '{"fast_decoder": true}'] [--json]
+
+Options after the stream selection set the fake service's volume and
+latency; see `python -m benchmarks.end_to_end --help`. --config is
+merged into the tap's config.json, so any tap setting can be compared.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.fake_bronto.server import FakeBrontoServer, \
+    add_arguments, from_arguments
+
+STREAM_OPERATIONS = {
+    'contact': 'readContacts',
+    'inbound_activity': 'readRecentInboundActivities',
+    'outbound_activity': 'readRecentOutboundActivities',
+    'list': 'readLists',
+    'unsubscribe': 'readUnsubscribes',
+}
+
+TAP = [sys.executable, '-c', 'from tap_bronto import main; main()']
+
+
+def run_tap(args, stdout=subprocess.PIPE):
+    return subprocess.run(TAP + args, stdout=stdout, check=True)
+
+
+def build_catalog(config_path, streams):
+    output = run_tap(['--config', config_path, '--discover']).stdout
+    catalog = json.loads(output)
+
+    for stream in catalog['streams']:
+        stream['metadata']['selected'] = stream['stream'] in streams
+
+    return catalog
+
+
+def sync(config_path, catalog_path):
+    """Runs a sync. Returns (seconds, records by stream, STATE messages,
+    peak RSS in bytes)."""
+    records = Counter()
+    states = 0
+
+    started = time.monotonic()
+    process = subprocess.Popen(
+        TAP + ['--config', config_path, '--properties', catalog_path],
+        stdout=subprocess.PIPE)
+
+    for line in process.stdout:
+        message = json.loads(line)
+
+        if message['type'] == 'RECORD':
+            records[message['stream']] += 1
+        elif message['type'] == 'STATE':
+            states += 1
+
+    # wait4 gives this child's own peak RSS, where getrusage(CHILDREN)
+    # would also count the discovery run.
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.monotonic() - started
+
+    if process.returncode != 0:
+        raise RuntimeError('tap-bronto exited with {}'
+                           .format(process.returncode))
+
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS.
+    peak_rss = usage.ru_maxrss
+
+    if sys.platform != 'darwin':
+        peak_rss = peak_rss * 1024
+
+    return elapsed, records, states, peak_rss
+
+
+def report(result):
+    print('{:<20} {:>10} {:>10}'.format('stream', 'records', 'API calls'))
+
+    for stream, counts in sorted(result['streams'].items()):
+        print('{:<20} {:>10} {:>10}'.format(
+            stream, counts['records'], counts['calls']))
+
+    print()
+    print('logins:        {}'.format(result['logins']))
+    print('STATE messages: {}'.format(result['states']))
+    print('elapsed:       {:.2f}s'.format(result['seconds']))
+    print('records/sec:   {:.0f}'.format(result['records_per_second']))
+    print('peak RSS:      {:.1f} MB'.format(result['peak_rss'] / 2 ** 20))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--hours', type=float, default=24,
+                        help='How much history to sync.')
+    parser.add_argument('--streams', default=','.join(STREAM_OPERATIONS))
+    parser.add_argument('--config', default='{}',
+                        help='JSON merged into the tap config.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    add_arguments(parser)
+
+    args = parser.parse_args()
+    streams = args.streams.split(',')
+
+    server = FakeBrontoServer(from_arguments(args)).start()
+
+    start_date = datetime.now(timezone.utc) - timedelta(hours=args.hours)
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_path = os.path.join(directory, 'config.json')
+        catalog_path = os.path.join(directory, 'catalog.json')
+
+        config = {
+            'api_token': 'benchmark',
+            'start_date': start_date.isoformat(),
+            'wsdl_url': server.wsdl_url,
+            'wsdl_cache_dir': os.path.join(directory, 'wsdl'),
+        }
+        config.update(json.loads(args.config))
+
+        with open(config_path, 'w') as handle:
+            json.dump(config, handle)
+
+        with open(catalog_path, 'w') as handle:
+            json.dump(build_catalog(config_path, streams), handle)
+
+        server.bronto.reset_stats()
+
+        seconds, records, states, peak_rss = sync(config_path,
+                                                  catalog_path)
+
+    stats = server.bronto.stats()
+    server.shutdown()
+
+    result = {
+        'seconds': seconds,
+        'records': sum(records.values()),
+        'records_per_second': sum(records.values()) / seconds,
+        'peak_rss': peak_rss,
+        'states': states,
+        'logins': stats['calls'].get('login', 0),
+        'streams': {
+            stream: {
+                'records': records[stream],
+                'calls': stats['calls'].get(STREAM_OPERATIONS[stream], 0),
+            } for stream in streams
+        },
+        'config': config,
+    }
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result)
+
+
+if __name__ == '__main__':
+    main()
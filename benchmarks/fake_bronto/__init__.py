@@ -0,0 +1,3 @@
+from benchmarks.fake_bronto.server import FakeBronto, FakeBrontoServer
+
+__all__ = ['FakeBronto', 'FakeBrontoServer']
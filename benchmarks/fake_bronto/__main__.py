@@ -0,0 +1,32 @@
+"""Runs the fake Bronto service in the foreground.
+
+    python -m benchmarks.fake_bronto [--port 8080] [--latency 0.2] ...
+
+Point tap-bronto at it with "wsdl_url": "http://127.0.0.1:8080/?wsdl".
+"""
+import argparse
+
+from benchmarks.fake_bronto.server import FakeBrontoServer, \
+    add_arguments, from_arguments
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    add_arguments(parser)
+
+    args = parser.parse_args()
+
+    server = FakeBrontoServer(from_arguments(args), args.host, args.port)
+
+    print('Serving fake Bronto at {}'.format(server.wsdl_url))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,494 @@
+"""A stand-in for the Bronto SOAP API, for benchmarks and offline runs.
+
+Serves a trimmed copy of the v4 WSDL and answers login, readContacts,
+readRecentInboundActivities, readRecentOutboundActivities, readLists
+and readUnsubscribes with synthetic records. Dated records are spread
+evenly over time at a configurable rate per hour, so any date window
+contains a predictable number of them. Filters and paging behave the
+way tap-bronto relies on:
+
+* readContacts and readUnsubscribes page by pageNumber, and return an
+  empty page once a window is exhausted. As in Bronto, AfterOrSameDay
+  matches from midnight of the given day.
+* The activity reads page by readDirection FIRST/NEXT, keeping a cursor
+  per session, and fault with "116: End of result set." after the last
+  page.
+* Calls without a valid session header fault with code 106.
+
+Faults can be injected for the nth call to an operation with fail(),
+for testing how the tap recovers. Activity pages are at most
+`page_size` long, whatever size the filter asks for.
+
+Every reply can be delayed by a fixed latency, and calls and records
+served are counted per operation. GET /stats returns those counts as
+JSON.
+"""
+import gzip
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+WSDL_PATH = os.path.join(os.path.dirname(__file__), 'bronto.wsdl')
+
+SOAP_NS = 'http://schemas.xmlsoap.org/soap/envelope/'
+BRONTO_NS = 'http://api.bronto.com/v4'
+
+ENVELOPE = ('<soap:Envelope xmlns:soap="{}"><soap:Body>{{}}</soap:Body>'
+            '</soap:Envelope>').format(SOAP_NS)
+
+EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+INBOUND_TYPES = ['open', 'click', 'conversion', 'unsubscribe', 'webform']
+OUTBOUND_TYPES = ['send', 'bounce', 'sendSkipped']
+UNSUBSCRIBE_METHODS = ['subscriber', 'admin', 'complaint', 'api']
+
+
+class Fault(Exception):
+    pass
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def find(element, name):
+    for child in element:
+        if local_name(child.tag) == name:
+            return child
+
+    return None
+
+
+def find_all(element, name):
+    return [child for child in element if local_name(child.tag) == name]
+
+
+def text(element, name, default=None):
+    child = find(element, name) if element is not None else None
+
+    if child is None or child.text is None:
+        return default
+
+    return child.text
+
+
+def parse_datetime(value):
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+
+    return parsed
+
+
+def format_datetime(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+def midnight(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def to_xml(fields):
+    parts = []
+
+    for name, value in fields:
+        if value is None:
+            continue
+
+        if isinstance(value, list):
+            parts.append(to_xml((name, item) for item in value))
+
+        elif isinstance(value, tuple):
+            parts.append('<{0}>{1}</{0}>'.format(name, to_xml(value)))
+
+        else:
+            if isinstance(value, datetime):
+                value = format_datetime(value)
+            elif isinstance(value, bool):
+                value = 'true' if value else 'false'
+
+            parts.append('<{0}>{1}</{0}>'.format(name, escape(str(value))))
+
+    return ''.join(parts)
+
+
+class Timeline:
+    """Dated records, one every `3600 / per_hour` seconds since EPOCH.
+
+    Record i is the i-th record in time, so a window maps to a range of
+    indexes and needs nothing stored."""
+
+    def __init__(self, per_hour):
+        self.step = 3600.0 / per_hour if per_hour else None
+
+    def span(self, start, end):
+        """Indexes of the records dated in [start, end)."""
+        if self.step is None or start is None or end is None:
+            return range(0)
+
+        now = datetime.now(timezone.utc)
+        end = min(end, now)
+
+        first = int(-(-(start - EPOCH).total_seconds() // self.step))
+        last = int(-(-(end - EPOCH).total_seconds() // self.step))
+
+        return range(max(first, 0), max(last, first, 0))
+
+    def date(self, index):
+        return EPOCH + timedelta(seconds=index * self.step)
+
+
+class FakeBronto:
+    """The data and per-session state behind the fake service."""
+
+    def __init__(self, contacts_per_hour=200, activities_per_hour=250,
+                 unsubscribes_per_hour=20, lists=50, page_size=5000,
+                 latency=0.0, jitter=0.0):
+        self.contacts = Timeline(contacts_per_hour)
+        self.inbound = Timeline(activities_per_hour)
+        self.outbound = Timeline(activities_per_hour)
+        self.unsubscribes = Timeline(unsubscribes_per_hour)
+        self.lists = lists
+        self.page_size = page_size
+        self.latency = latency
+        self.jitter = jitter
+
+        self.lock = threading.Lock()
+        self.sessions = set()
+        self.cursors = {}
+        self.calls = Counter()
+        self.records = Counter()
+        self.faults = {}
+
+    def stats(self):
+        with self.lock:
+            return {'calls': dict(self.calls),
+                    'records': dict(self.records)}
+
+    def reset_stats(self):
+        with self.lock:
+            self.calls.clear()
+            self.records.clear()
+
+    def fail(self, operation, call, fault):
+        """Makes the `call`th call to `operation` fault with `fault`,
+        e.g. '101: Internal error.'. A 106 fault first ends every
+        session, as if they had expired."""
+        with self.lock:
+            self.faults[(operation, call)] = fault
+
+    def wait(self):
+        delay = self.latency + random.uniform(0, self.jitter)
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def handle(self, envelope):
+        """Returns the XML body of the reply, or raises Fault."""
+        root = ElementTree.fromstring(envelope)
+        header = find(root, 'Header')
+        body = find(root, 'Body')
+        request = body[0]
+        operation = local_name(request.tag)
+
+        with self.lock:
+            self.calls[operation] += 1
+            fault = self.faults.pop((operation, self.calls[operation]), None)
+
+            if fault is not None and fault.startswith('106'):
+                self.sessions.clear()
+
+        self.wait()
+
+        if fault is not None:
+            raise Fault(fault)
+
+        if operation == 'login':
+            return self.login()
+
+        session_id = text(find(header, 'sessionHeader')
+                          if header is not None else None, 'sessionId')
+
+        with self.lock:
+            if session_id not in self.sessions:
+                raise Fault('106: Invalid session.')
+
+        handler = getattr(self, operation, None)
+
+        if handler is None:
+            raise Fault('102: Unsupported operation {}.'.format(operation))
+
+        records = handler(session_id, request)
+
+        with self.lock:
+            self.records[operation] += len(records)
+
+        return '<ns2:{0}Response xmlns:ns2="{1}">{2}</ns2:{0}Response>'.format(
+            operation, BRONTO_NS,
+            ''.join('<return>{}</return>'.format(to_xml(record))
+                    for record in records))
+
+    def login(self):
+        session_id = hashlib.md5(os.urandom(16)).hexdigest()
+
+        with self.lock:
+            self.sessions.add(session_id)
+
+        return ('<ns2:loginResponse xmlns:ns2="{}"><return>{}</return>'
+                '</ns2:loginResponse>').format(BRONTO_NS, session_id)
+
+    def page(self, indexes, request):
+        page_number = int(text(request, 'pageNumber', 1))
+        start = (page_number - 1) * self.page_size
+
+        return indexes[start:start + self.page_size]
+
+    def readContacts(self, session_id, request):
+        _filter = find(request, 'filter')
+        start = None
+        end = None
+
+        for date_value in find_all(_filter, 'modified'):
+            operator = text(date_value, 'operator')
+            value = parse_datetime(text(date_value, 'value'))
+
+            if operator == 'AfterOrSameDay':
+                start = midnight(value)
+            elif operator == 'After':
+                start = value + timedelta(microseconds=1)
+            elif operator == 'Before':
+                end = value
+            elif operator == 'BeforeOrSameDay':
+                end = midnight(value) + timedelta(days=1)
+            elif operator == 'SameDay':
+                start = midnight(value)
+                end = start + timedelta(days=1)
+
+        include = {name: text(request, name) == 'true'
+                   for name in ('includeLists', 'includeGeoIpData',
+                                'includeTechnologyData', 'includeRFMData',
+                                'includeEngagementData')}
+
+        return [self.contact(i, include) for i in
+                self.page(self.contacts.span(start, end), request)]
+
+    def contact(self, index, include):
+        modified = self.contacts.date(index)
+        read_only = []
+
+        if include['includeGeoIpData']:
+            read_only += [('geoIPCity', 'Philadelphia'),
+                          ('geoIPStateRegion', 'PA'),
+                          ('geoIPZip', '19103'),
+                          ('geoIPCountry', 'United States'),
+                          ('geoIPCountryCode', 'US')]
+
+        if include['includeTechnologyData']:
+            read_only += [('primaryBrowser', 'Firefox'),
+                          ('operatingSystem', 'Linux')]
+
+        if include['includeRFMData']:
+            read_only += [('firstOrderDate', modified - timedelta(days=90)),
+                          ('totalOrders', index % 7),
+                          ('totalRevenue', (index % 7) * 19.5)]
+
+        if include['includeEngagementData']:
+            read_only += [('lastOpenDate', modified - timedelta(days=1))]
+
+        return (
+            ('id', 'contact-{}'.format(index)),
+            ('email', 'contact{}@example.com'.format(index)),
+            ('status', 'active'),
+            ('msgPref', 'html'),
+            ('source', 'api'),
+            ('created', modified - timedelta(days=index % 365)),
+            ('modified', modified),
+            ('deleted', False),
+            ('listIds', (['list-{}'.format(index % max(self.lists, 1))]
+                         if include['includeLists'] else None)),
+            ('fields', [(('fieldId', 'field-1'),
+                         ('content', 'value {}'.format(index)))]),
+            ('numSends', index % 100),
+            ('numBounces', index % 3),
+            ('numOpens', index % 50),
+            ('numClicks', index % 20),
+            ('numConversions', index % 5),
+            ('conversionAmount', (index % 5) * 10.0),
+            ('readOnlyContactData', tuple(read_only) or None),
+        )
+
+    def read_activities(self, session_id, request, timeline, types):
+        operation = local_name(request.tag)
+        _filter = find(request, 'filter')
+        key = (session_id, operation)
+
+        if text(_filter, 'readDirection', 'FIRST') == 'FIRST':
+            start = text(_filter, 'start')
+            end = text(_filter, 'end')
+            indexes = timeline.span(start and parse_datetime(start),
+                                    end and parse_datetime(end))
+            offset = 0
+
+        else:
+            with self.lock:
+                indexes, offset = self.cursors.get(key, (range(0), 0))
+
+            if offset >= len(indexes):
+                raise Fault('116: End of result set.')
+
+        size = min(int(text(_filter, 'size', self.page_size)),
+                   self.page_size)
+        page = indexes[offset:offset + size]
+
+        with self.lock:
+            self.cursors[key] = (indexes, offset + len(page))
+
+        return [self.activity(i, timeline, types) for i in page]
+
+    def activity(self, index, timeline, types):
+        return (
+            ('createdDate', timeline.date(index)),
+            ('contactId', 'contact-{}'.format(index % 100000)),
+            ('listId', 'list-{}'.format(index % max(self.lists, 1))),
+            ('messageId', 'message-{}'.format(index % 40)),
+            ('deliveryId', 'delivery-{}'.format(index % 400)),
+            ('activityType', types[index % len(types)]),
+            ('emailAddress', 'contact{}@example.com'.format(index % 100000)),
+            ('contactStatus', 'active'),
+            ('messageName', 'Message {}'.format(index % 40)),
+            ('deliveryType', 'normal'),
+            ('deliveryStart', timeline.date(index) - timedelta(hours=1)),
+        )
+
+    def readRecentInboundActivities(self, session_id, request):
+        return self.read_activities(session_id, request, self.inbound,
+                                    INBOUND_TYPES)
+
+    def readRecentOutboundActivities(self, session_id, request):
+        return self.read_activities(session_id, request, self.outbound,
+                                    OUTBOUND_TYPES)
+
+    def readLists(self, session_id, request):
+        page_number = int(text(request, 'pageNumber', 1))
+        page_size = int(text(request, 'pageSize', self.page_size))
+        first = (page_number - 1) * page_size
+
+        return [(('id', 'list-{}'.format(i)),
+                 ('name', 'list_{}'.format(i)),
+                 ('label', 'List {}'.format(i)),
+                 ('activeCount', i * 10),
+                 ('status', 'active'))
+                for i in range(first, min(first + page_size, self.lists))]
+
+    def readUnsubscribes(self, session_id, request):
+        _filter = find(request, 'filter')
+        start = text(_filter, 'start')
+        end = text(_filter, 'end')
+        indexes = self.unsubscribes.span(start and parse_datetime(start),
+                                         end and parse_datetime(end))
+
+        return [(('contactId', 'contact-{}'.format(i % 100000)),
+                 ('deliveryId', 'delivery-{}'.format(i % 400)),
+                 ('method', UNSUBSCRIBE_METHODS[i % 4]),
+                 ('created', self.unsubscribes.date(i)))
+                for i in self.page(indexes, request)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, body, status=200, content_type='text/xml; charset=utf-8'):
+        body = body.encode('utf-8')
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=1)
+            self.send_header('Content-Encoding', 'gzip')
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/stats'):
+            self.reply(json.dumps(self.server.bronto.stats()),
+                       content_type='application/json')
+            return
+
+        with open(WSDL_PATH) as handle:
+            wsdl = handle.read()
+
+        self.reply(wsdl.replace('LOCATION', 'http://{}:{}/'.format(
+            *self.server.server_address[:2])))
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        envelope = self.rfile.read(length)
+
+        try:
+            self.reply(ENVELOPE.format(self.server.bronto.handle(envelope)))
+
+        except Fault as fault:
+            self.reply(ENVELOPE.format(
+                '<soap:Fault><faultcode>soap:Server</faultcode>'
+                '<faultstring>{}</faultstring></soap:Fault>'
+                .format(escape(str(fault)))), status=500)
+
+
+class FakeBrontoServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, bronto, host='127.0.0.1', port=0):
+        ThreadingHTTPServer.__init__(self, (host, port), Handler)
+        self.bronto = bronto
+
+    @property
+    def wsdl_url(self):
+        return 'http://{}:{}/?wsdl'.format(*self.server_address[:2])
+
+    def start(self):
+        """Serves on a background thread. Returns self."""
+        thread = threading.Thread(target=self.serve_forever,
+                                  name='fake-bronto', daemon=True)
+        thread.start()
+
+        return self
+
+
+def add_arguments(parser):
+    parser.add_argument('--contacts-per-hour', type=float, default=200)
+    parser.add_argument('--activities-per-hour', type=float, default=250,
+                        help='For inbound and outbound activities each.')
+    parser.add_argument('--unsubscribes-per-hour', type=float, default=20)
+    parser.add_argument('--lists', type=int, default=50)
+    parser.add_argument('--page-size', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to wait before each reply.')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Up to this many more seconds, at random.')
+
+
+def from_arguments(args):
+    return FakeBronto(
+        contacts_per_hour=args.contacts_per_hour,
+        activities_per_hour=args.activities_per_hour,
+        unsubscribes_per_hour=args.unsubscribes_per_hour,
+        lists=args.lists,
+        page_size=args.page_size,
+        latency=args.latency,
+        jitter=args.jitter)
@@ -0,0 +1,101 @@
+"""Micro-benchmark for the catalog field selector.
+
+Compares the compiled selector in tap_bronto.schemas against the
+original per-record implementation, on synthetic contact records.
+
+    python -m benchmarks.field_selector [--records N] [--repeat R]
+"""
+import argparse
+import time
+
+from datetime import datetime, timezone
+
+from funcy import project
+
+from tap_bronto.schemas import CONTACT_SCHEMA, get_field_selector, \
+    is_selected
+
+
+def legacy_field_selector(schema):
+    selections = []
+
+    for field, schema in schema.get('properties').items():
+        if is_selected(schema):
+            selections.append(field)
+
+    def select(data):
+        to_return = {}
+
+        for k, v in project(data, selections).items():
+            if isinstance(v, datetime):
+                to_return[k] = v.replace(microsecond=0).isoformat()
+
+            else:
+                to_return[k] = v
+
+        return to_return
+
+    return select
+
+
+def make_record(i):
+    now = datetime(2018, 1, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+    record = {}
+
+    for field, field_schema in CONTACT_SCHEMA['properties'].items():
+        types = field_schema.get('type')
+
+        if 'number' in types or 'integer' in types:
+            record[field] = i
+        elif 'boolean' in types:
+            record[field] = bool(i % 2)
+        elif 'array' in types:
+            record[field] = [str(i)]
+        elif 'Date' in field or field in ('created', 'modified'):
+            record[field] = now
+        else:
+            record[field] = 'value-{}'.format(i)
+
+    # Bronto sends fields the catalog doesn't know about, too.
+    record['fields'] = []
+    return record
+
+
+def bench(name, selector, records, repeat):
+    best = None
+
+    for _ in range(repeat):
+        started = time.perf_counter()
+
+        for record in records:
+            selector(record)
+
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    rate = len(records) / best
+    print('{:<10} {:>12,.0f} records/sec'.format(name, rate))
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    records = [make_record(i) for i in range(args.records)]
+
+    legacy = legacy_field_selector(CONTACT_SCHEMA)
+    compiled = get_field_selector(CONTACT_SCHEMA)
+
+    assert all(legacy(r) == compiled(r) for r in records[:100])
+
+    before = bench('legacy', legacy, records, args.repeat)
+    after = bench('compiled', compiled, records, args.repeat)
+
+    print('speedup    {:>12.2f}x'.format(after / before))
+
+
+if __name__ == '__main__':
+    main()
@@ -16,6 +16,9 @@ setup(
         'funcy==1.10',
         'voluptuous==0.10.5',
     ],
+    extras_require={
+        'orjson': ['orjson'],
+    },
     entry_points='''
     [console_scripts]
     tap-bronto=tap_bronto:main
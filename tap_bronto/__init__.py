@@ -8,13 +8,23 @@ from tap_bronto.endpoints.unsubscribe import UnsubscribeStream
 from tap_bronto.endpoints.outbound_activity import OutboundActivityStream
 from tap_bronto.endpoints.inbound_activity import InboundActivityStream
 
+from tap_bronto.client import get_retry_counts
+from tap_bronto.metrics import log_summary
+from tap_bronto.output import configure as configure_output, \
+    flush as flush_output
+from tap_bronto.profiling import profile, CPROFILE, MODES
+from tap_bronto.scheduler import SyncScheduler
 from tap_bronto.schemas import is_selected
-from tap_bronto.state import load_state, save_state
+from tap_bronto.state import BookmarkManager, load_state
 
 LOGGER = singer.get_logger()  # noqa
 
 
 def validate_config(config):
+    if 'accounts' in config:
+        validate_accounts(config.get('accounts'))
+        return
+
     required_keys = ['api_token']
     missing_keys = []
     null_keys = []
@@ -41,6 +51,40 @@ def validate_config(config):
         raise RuntimeError
 
 
+def validate_accounts(accounts):
+    if not isinstance(accounts, list) or not accounts:
+        LOGGER.fatal("Config accounts must be a non-empty list.")
+        raise RuntimeError
+
+    names = set()
+
+    for index, account in enumerate(accounts):
+        for required_key in ['account', 'api_token']:
+            if account.get(required_key) is None:
+                LOGGER.fatal("Config account {} is missing {}."
+                             .format(index, required_key))
+                raise RuntimeError
+
+        if account['account'] in names:
+            LOGGER.fatal("Config account {} appears twice."
+                         .format(account['account']))
+            raise RuntimeError
+
+        names.add(account['account'])
+
+
+def get_account_configs(config):
+    """Returns the config for each account to sync. Each entry in
+    `accounts` is the rest of the config, with its own keys on top."""
+    if 'accounts' not in config:
+        return [config]
+
+    shared = {key: value for key, value in config.items()
+              if key != 'accounts'}
+
+    return [dict(shared, **account) for account in config['accounts']]
+
+
 def load_config(filename):
     config = {}
 
@@ -91,14 +135,14 @@ def do_sync(args):
     LOGGER.info("Starting sync.")
 
     config = load_config(args.config)
-    state = load_state(args.state)
+    bookmarks = BookmarkManager.from_config(load_state(args.state), config)
     catalog = load_catalog(args.properties)
 
+    configure_output(config)
+
     stream_accessors = []
 
     for stream_catalog in catalog.get('streams'):
-        stream_accessor = None
-
         if not is_selected(stream_catalog):
             LOGGER.info("'{}' is not marked selected, skipping."
                         .format(stream_catalog.get('stream')))
@@ -106,22 +150,30 @@ def do_sync(args):
 
         for available_stream_accessor in AVAILABLE_STREAM_ACCESSORS:
             if available_stream_accessor.matches_catalog(stream_catalog):
-                stream_accessors.append(available_stream_accessor(
-                    config, state, stream_catalog))
+                for account_config in get_account_configs(config):
+                    stream_accessors.append(available_stream_accessor(
+                        account_config, bookmarks, stream_catalog))
 
                 break
 
-    for stream_accessor in stream_accessors:
-        try:
-            stream_accessor.state = state
-            stream_accessor.sync()
-            state = stream_accessor.state
+    scheduler = SyncScheduler(
+        stream_accessors, bookmarks,
+        max_workers=config.get('stream_workers', 1))
+
+    scheduler.run()
+
+    log_summary(stream_accessor.metrics
+                for stream_accessor in stream_accessors)
+
+    retry_counts = get_retry_counts()
 
-        except Exception as exception:
-            LOGGER.error(exception)
-            LOGGER.error('Failed to sync endpoint, moving on!')
+    if retry_counts:
+        LOGGER.info('Retried API calls: {}'.format(
+            ', '.join('{} {}'.format(count, reason)
+                      for reason, count in sorted(retry_counts.items()))))
 
-    save_state(state)
+    bookmarks.emit()
+    flush_output()
 
 
 def do_discover(args):
@@ -129,7 +181,8 @@ def do_discover(args):
 
     catalog = []
 
-    config = load_config(args.config)
+    # Every account has the same streams.
+    config = get_account_configs(load_config(args.config))[0]
 
     for available_stream_accessor in AVAILABLE_STREAM_ACCESSORS:
         stream_accessor = available_stream_accessor(config)
@@ -160,13 +213,28 @@ def main():
               'fields for replication in the generated catalog'),
         action='store_true')
 
+    parser.add_argument(
+        '--profile',
+        help='Profile the run, writing a report to this file')
+    parser.add_argument(
+        '--profile-mode',
+        help=('"cprofile" traces every call; "sample" samples every '
+              'thread\'s stack and is cheap enough for production'),
+        choices=MODES, default=CPROFILE)
+    parser.add_argument(
+        '--profile-interval',
+        help='Seconds between samples in "sample" mode',
+        type=float, default=0.01)
+
     args = parser.parse_args()
 
     try:
-        if args.discover:
-            do_discover(args)
-        else:
-            do_sync(args)
+        with profile(args.profile, args.profile_mode,
+                     args.profile_interval):
+            if args.discover:
+                do_discover(args)
+            else:
+                do_sync(args)
 
     except BaseException as exception:
         LOGGER.error(str(exception))
@@ -0,0 +1,354 @@
+import http.client
+import queue
+import random
+import re
+import socket
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+
+import singer
+import suds
+import suds.cache
+import suds.client
+
+from tap_bronto.decoder import FastDecoder
+from tap_bronto.metrics import StreamMetrics, LOGIN, SOAP_CALL, DECODE
+from tap_bronto.ratelimit import get_rate_limiter
+from tap_bronto.transport import get_transport
+
+BRONTO_WSDL = 'https://api.bronto.com/v4?wsdl'
+
+SESSION_EXPIRED_FAULT_CODES = ['106']
+END_OF_RESULTS_FAULT_CODES = ['116']
+TRANSIENT_FAULT_CODES = ['101']
+
+THROTTLED_FAULT_PATTERNS = ['rate limit', 'too many', 'throttl', 'concurrent']
+THROTTLED_HTTP_STATUSES = [429, 503]
+TRANSIENT_HTTP_STATUSES = [500, 502, 504]
+
+SESSION_EXPIRED = 'session_expired'
+THROTTLED = 'throttled'
+END_OF_RESULTS = 'end_of_results'
+TIMEOUT = 'timeout'
+TRANSIENT = 'transient'
+
+RETRYABLE = [SESSION_EXPIRED, THROTTLED, TIMEOUT, TRANSIENT]
+
+LOGGER = singer.get_logger()  # noqa
+
+RETRY_COUNTS = Counter()
+_RETRY_COUNTS_LOCK = threading.Lock()
+
+_FAULT_CODE = re.compile(r'^\s*(\d+)\s*:')
+
+_WSDL_LOADED = set()
+_WSDL_LOCK = threading.Lock()
+
+
+def get_fault_code(fault):
+    """Bronto prefixes fault strings with a numeric code, e.g.
+    "116: End of result set." Returns that code, or None."""
+    faultstring = getattr(getattr(fault, 'fault', None),
+                          'faultstring', None) or str(fault)
+
+    match = _FAULT_CODE.match(faultstring)
+
+    if match is None:
+        return None
+
+    return match.group(1)
+
+
+def get_http_status(error):
+    """suds raises Exception((status, reason)) for HTTP errors other
+    than 500, and TransportError from its transport."""
+    if isinstance(error, suds.transport.TransportError):
+        return error.httpcode
+
+    if (type(error) is Exception and error.args and
+            isinstance(error.args[0], tuple) and
+            isinstance(error.args[0][0], int)):
+        return error.args[0][0]
+
+    return None
+
+
+def classify_error(error):
+    """Sorts an error from a Bronto call into one of SESSION_EXPIRED,
+    THROTTLED, END_OF_RESULTS, TIMEOUT or TRANSIENT. Returns None for
+    anything that retrying won't fix."""
+    if isinstance(error, suds.WebFault):
+        code = get_fault_code(error)
+        message = str(error).lower()
+
+        if code in END_OF_RESULTS_FAULT_CODES:
+            return END_OF_RESULTS
+
+        if code in SESSION_EXPIRED_FAULT_CODES or 'session' in message:
+            return SESSION_EXPIRED
+
+        if any(pattern in message for pattern in THROTTLED_FAULT_PATTERNS):
+            return THROTTLED
+
+        if code in TRANSIENT_FAULT_CODES:
+            return TRANSIENT
+
+        return None
+
+    if isinstance(error, socket.timeout):
+        return TIMEOUT
+
+    status = get_http_status(error)
+
+    if status in THROTTLED_HTTP_STATUSES:
+        return THROTTLED
+
+    if status in TRANSIENT_HTTP_STATUSES:
+        return TRANSIENT
+
+    if isinstance(error, (OSError, http.client.HTTPException)):
+        return TRANSIENT
+
+    return None
+
+
+def is_session_expired(error):
+    return classify_error(error) == SESSION_EXPIRED
+
+
+def is_end_of_results(error):
+    return classify_error(error) == END_OF_RESULTS
+
+
+def get_retry_counts():
+    """Retries made by every session in this process, by reason."""
+    with _RETRY_COUNTS_LOCK:
+        return Counter(RETRY_COUNTS)
+
+
+def get_wsdl_cache(config):
+    location = config.get('wsdl_cache_dir')
+
+    if location is None:
+        return suds.cache.ObjectCache(days=1)
+
+    return suds.cache.ObjectCache(
+        location=location,
+        days=int(config.get('wsdl_cache_days', 7)))
+
+
+def get_client_options(config):
+    if config.get('http_transport', 'pooled') == 'pooled':
+        return {'transport': get_transport(config)}
+
+    return {'timeout': float(config.get('http_read_timeout', 3600))}
+
+
+def get_wsdl_client(config):
+    """Returns a new client for the configured WSDL, with a parsed copy
+    of the WSDL all its own.
+
+    suds resolves reply types through the parsed WSDL, and two threads
+    unmarshalling different replies with the same one can each get the
+    other's types. So clients can't share a WSDL, but only the first
+    one for a URL downloads it: the rest read it from the cache."""
+    url = config.get('wsdl_url', BRONTO_WSDL)
+
+    with _WSDL_LOCK:
+        if url not in _WSDL_LOADED:
+            LOGGER.info('Loading WSDL from {}'.format(url))
+            _WSDL_LOADED.add(url)
+
+        client = suds.client.Client(
+            url,
+            cache=get_wsdl_cache(config),
+            **get_client_options(config))
+
+    # suds-py3 reads the address as bytes, which urllib rejects.
+    location = client.wsdl.services[0].ports[0].location
+
+    if isinstance(location, bytes):
+        client.set_options(location=location.decode('utf-8'))
+
+    return client
+
+
+class BrontoSession:
+    """A logged-in Bronto API session.
+
+    The session ID is kept for the lifetime of the object, and we only
+    log in again when Bronto tells us the session has expired. Calls
+    that fail transiently are retried up to `max_retries` times. Every
+    call waits its turn on the rate limiter shared by all sessions on
+    the account. Sessions are not thread-safe; use one per thread.
+
+    Each session has its own client, and so its own parsed WSDL."""
+
+    def __init__(self, config, metrics=None):
+        self.config = config
+        self.metrics = metrics or StreamMetrics(None)
+        self.client = None
+        self.decoder = None
+        self.session_id = None
+        self.fast_decoder = bool(config.get('fast_decoder', False))
+        self.max_retries = int(config.get('max_retries', 5))
+        self.retry_base_delay = float(config.get('retry_base_delay', 1))
+        self.retry_max_delay = float(config.get('retry_max_delay', 60))
+        self.retries = Counter()
+        self.rate_limiter = get_rate_limiter(config)
+
+    def login(self):
+        if self.client is None:
+            self.client = get_wsdl_client(self.config)
+
+        self.client.set_options(soapheaders=())
+
+        try:
+            with self.rate_limiter.limit(), self.metrics.timer(LOGIN):
+                self.session_id = self.client.service.login(
+                    self.config.get('api_token'))
+
+        except suds.WebFault:
+            LOGGER.fatal("Login failed!")
+            raise
+
+        session_header = self.client.factory.create('sessionHeader')
+        session_header.sessionId = self.session_id
+        self.client.set_options(soapheaders=session_header)
+
+        return self.client
+
+    def ensure_logged_in(self):
+        if self.session_id is None:
+            self.login()
+
+        return self.client
+
+    @property
+    def factory(self):
+        return self.ensure_logged_in().factory
+
+    def get_backoff(self, attempt):
+        """Exponential backoff with full jitter."""
+        ceiling = min(self.retry_max_delay,
+                      self.retry_base_delay * (2 ** (attempt - 1)))
+
+        return random.uniform(0, ceiling)
+
+    def count_retry(self, reason):
+        self.retries[reason] += 1
+
+        with _RETRY_COUNTS_LOCK:
+            RETRY_COUNTS[reason] += 1
+
+    def send(self, method, args, kwargs, retxml):
+        if not retxml:
+            with self.rate_limiter.limit(), self.metrics.timer(SOAP_CALL):
+                return getattr(self.client.service, method)(*args, **kwargs)
+
+        self.client.set_options(retxml=True)
+
+        try:
+            with self.rate_limiter.limit(), self.metrics.timer(SOAP_CALL):
+                return getattr(self.client.service, method)(*args, **kwargs)
+        finally:
+            self.client.set_options(retxml=False)
+
+    def recover(self, method, error, attempt):
+        """Gets ready to make a call to `method` again after it failed
+        with `error`, for the `attempt`th time: logs in again if the
+        session expired, and otherwise backs off. Raises `error` if
+        retrying won't fix it, or it has already been retried
+        `max_retries` times."""
+        reason = classify_error(error)
+
+        if reason not in RETRYABLE or attempt > self.max_retries:
+            raise error
+
+        self.count_retry(reason)
+
+        if reason == SESSION_EXPIRED:
+            LOGGER.info('Bronto session expired, logging in again.')
+            self.session_id = None
+            return
+
+        delay = self.get_backoff(attempt)
+
+        if reason == THROTTLED:
+            # Hold back every session on the account, not just this one,
+            # or the others keep us throttled.
+            self.rate_limiter.throttled(delay)
+
+        LOGGER.warning('{} calling {} ({}), retrying in {:.1f}s '
+                       '(attempt {} of {})'
+                       .format(reason, method, error, delay, attempt,
+                               self.max_retries))
+
+        time.sleep(delay)
+
+    def invoke(self, method, args, kwargs, retxml=False, retry=True):
+        attempt = 0
+
+        while True:
+            try:
+                self.ensure_logged_in()
+                result = self.send(method, args, kwargs, retxml)
+                self.rate_limiter.succeeded()
+                return result
+
+            except Exception as error:
+                if not retry:
+                    raise
+
+                attempt = attempt + 1
+                self.recover(method, error, attempt)
+
+    def call(self, method, *args, retry=True, **kwargs):
+        """Calls `method`, retrying with backoff when the error is one
+        classify_error() says is worth retrying. With `retry` false, the
+        error is raised instead, for the caller to recover() from."""
+        return self.invoke(method, args, kwargs, retry=retry)
+
+    def call_raw(self, method, *args, retry=True, **kwargs):
+        """Like call(), but returns the reply XML without unmarshalling
+        it. Faults are still raised as suds.WebFault."""
+        return self.invoke(method, args, kwargs, retxml=True, retry=retry)
+
+    def read(self, method, *args, retry=True, **kwargs):
+        """Calls a read* method and returns its records. With the
+        fast_decoder option these are plain dicts decoded straight from
+        the reply; otherwise they are suds objects."""
+        if self.fast_decoder:
+            if self.decoder is None:
+                self.decoder = FastDecoder(self.ensure_logged_in())
+
+            if self.decoder.supports(method):
+                reply = self.call_raw(method, *args, retry=retry, **kwargs)
+
+                with self.metrics.timer(DECODE):
+                    return self.decoder.decode(method, reply)
+
+        return self.call(method, *args, retry=retry, **kwargs)
+
+
+class SessionPool:
+    """A fixed number of sessions shared by worker threads. Each
+    session is handed to one thread at a time."""
+
+    def __init__(self, config, size, metrics=None):
+        self.sessions = queue.Queue()
+
+        for _ in range(size):
+            self.sessions.put(BrontoSession(config, metrics))
+
+    @contextmanager
+    def session(self):
+        session = self.sessions.get()
+
+        try:
+            yield session
+        finally:
+            self.sessions.put(session)
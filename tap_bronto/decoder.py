@@ -0,0 +1,168 @@
+import io
+import threading
+
+from xml.etree import ElementTree
+
+import singer
+
+LOGGER = singer.get_logger()  # noqa
+
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+def identity(value):
+    return value
+
+
+class UnsupportedType(Exception):
+    pass
+
+
+class FastDecoder:
+    """Decodes raw read* SOAP replies straight into plain dicts.
+
+    suds builds a full object tree for every reply and we immediately
+    turn it back into dicts. Instead, this walks the reply with
+    iterparse, one `return` element at a time, converting leaf values
+    with the same suds builtin types the WSDL declares. Nested objects
+    (readOnlyContactData, for example) become nested dicts.
+
+    Methods whose return type can't be described this way are left to
+    suds: supports() returns False for them."""
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.fields = {}
+
+    def find_method(self, name):
+        for service in self.client.wsdl.services:
+            for port in service.ports:
+                method = port.methods.get(name)
+
+                if method is not None:
+                    return method
+
+        return None
+
+    def compile_type(self, schema_type, seen=()):
+        resolved = schema_type.resolve()
+
+        if resolved in seen:
+            raise UnsupportedType(resolved.name)
+
+        fields = {}
+
+        for child, _ in resolved.children():
+            child_type = child.resolve()
+            unbounded = child.unbounded()
+
+            if child_type.builtin():
+                fields[child.name] = (child_type.translate, None, unbounded)
+
+            elif child_type.enum() or not child_type.children():
+                fields[child.name] = (identity, None, unbounded)
+
+            else:
+                fields[child.name] = (
+                    None,
+                    self.compile_type(child_type, seen + (resolved,)),
+                    unbounded)
+
+        return fields
+
+    def compile_method(self, name):
+        method = self.find_method(name)
+
+        if method is None:
+            raise UnsupportedType(name)
+
+        returned_types = method.binding.output.returned_types(method)
+
+        if len(returned_types) != 1:
+            raise UnsupportedType(name)
+
+        returned_type = returned_types[0]
+
+        # suds unwraps document/literal replies to the `return` element,
+        # unless the client was built with unwrap=False.
+        if returned_type.name != 'return':
+            child, _ = returned_type.resolve().get_child('return')
+
+            if child is None:
+                raise UnsupportedType(name)
+
+            returned_type = child
+
+        if returned_type.resolve().builtin():
+            raise UnsupportedType(name)
+
+        return self.compile_type(returned_type)
+
+    def get_fields(self, method):
+        with self.lock:
+            if method not in self.fields:
+                try:
+                    self.fields[method] = self.compile_method(method)
+                except UnsupportedType as e:
+                    LOGGER.info('Decoding {} with suds ({} is not '
+                                'supported by the fast decoder).'
+                                .format(method, e))
+                    self.fields[method] = None
+
+            return self.fields[method]
+
+    def supports(self, method):
+        return self.get_fields(method) is not None
+
+    def decode_element(self, element, fields):
+        record = {}
+
+        for child in element:
+            name = local_name(child.tag)
+            spec = fields.get(name)
+
+            if spec is None:
+                value = child.text
+                unbounded = False
+
+            else:
+                translate, children, unbounded = spec
+
+                if children is None:
+                    value = translate(child.text)
+                else:
+                    value = self.decode_element(child, children)
+
+            if unbounded:
+                record.setdefault(name, []).append(value)
+            else:
+                record[name] = value
+
+        return record
+
+    def decode(self, method, reply):
+        """Returns the list of records in the raw reply to `method`."""
+        fields = self.get_fields(method)
+        records = []
+        depth = 0
+
+        events = ElementTree.iterparse(io.BytesIO(reply),
+                                       events=('start', 'end'))
+
+        for event, element in events:
+            if event == 'start':
+                depth = depth + 1
+                continue
+
+            depth = depth - 1
+
+            # Envelope > Body > {method}Response > return
+            if depth == 3 and local_name(element.tag) == 'return':
+                records.append(self.decode_element(element, fields))
+                element.clear()
+
+        return records
+
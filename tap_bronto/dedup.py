@@ -0,0 +1,201 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+import singer
+
+LOGGER = singer.get_logger()  # noqa
+
+# SQLite limits how many parameters one statement can have.
+CHUNK_SIZE = 500
+
+NEW = 'new'
+CHANGED = 'changed'
+
+
+def get_key(record, key_properties):
+    return json.dumps([record.get(key) for key in key_properties],
+                      separators=(',', ':'), default=str)
+
+
+def get_content_hash(record):
+    return hashlib.blake2b(
+        json.dumps(record, sort_keys=True, separators=(',', ':'),
+                   default=str).encode('utf-8'),
+        digest_size=16).hexdigest()
+
+
+class DedupStore:
+    """An on-disk index from each record's key to a hash of its content,
+    per stream, used to skip records that were emitted before and
+    haven't changed since.
+
+    Entries not seen for `ttl` seconds are evicted, and past
+    `max_entries` the least recently seen go first. Eviction happens
+    when the store is opened, so the file can only grow by one run's
+    worth of new records past the limit.
+
+    Changes are only committed by commit(), which should happen once
+    the records they belong to are covered by a STATE message. If a run
+    dies before then, the records are emitted again next time rather
+    than lost. Can be shared by threads."""
+
+    def __init__(self, path, ttl=None, max_entries=None):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS records ('
+            ' stream TEXT NOT NULL,'
+            ' key TEXT NOT NULL,'
+            ' hash TEXT NOT NULL,'
+            ' seen_at REAL NOT NULL,'
+            ' PRIMARY KEY (stream, key))')
+        self.connection.execute(
+            'CREATE INDEX IF NOT EXISTS records_seen_at '
+            'ON records (seen_at)')
+        self.connection.commit()
+
+        self.evict()
+
+    def has_entries(self, stream):
+        with self.lock:
+            return self.connection.execute(
+                'SELECT 1 FROM records WHERE stream = ? LIMIT 1',
+                (stream,)).fetchone() is not None
+
+    def find_hashes(self, stream, keys):
+        hashes = {}
+
+        for i in range(0, len(keys), CHUNK_SIZE):
+            chunk = keys[i:i + CHUNK_SIZE]
+
+            hashes.update(self.connection.execute(
+                'SELECT key, hash FROM records '
+                'WHERE stream = ? AND key IN ({})'
+                .format(', '.join('?' * len(chunk))),
+                [stream] + chunk))
+
+        return hashes
+
+    def changes(self, stream, keys, hashes):
+        """Records that `keys` were seen with content `hashes`. Returns,
+        for each, NEW, CHANGED, or None if it's the same as before."""
+        now = time.time()
+
+        with self.lock:
+            stored = self.find_hashes(stream, list(set(keys)))
+            changes = []
+
+            for key, content_hash in zip(keys, hashes):
+                previous = stored.get(key)
+
+                if previous is None:
+                    changes.append(NEW)
+                elif previous != content_hash:
+                    changes.append(CHANGED)
+                else:
+                    changes.append(None)
+
+                stored[key] = content_hash
+
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?)',
+                [(stream, key, content_hash, now)
+                 for key, content_hash in zip(keys, hashes)])
+
+        return changes
+
+    def evict(self):
+        evicted = 0
+
+        with self.lock:
+            if self.ttl is not None:
+                evicted += self.connection.execute(
+                    'DELETE FROM records WHERE seen_at < ?',
+                    (time.time() - self.ttl,)).rowcount
+
+            if self.max_entries is not None:
+                count, = self.connection.execute(
+                    'SELECT COUNT(*) FROM records').fetchone()
+
+                if count > self.max_entries:
+                    evicted += self.connection.execute(
+                        'DELETE FROM records WHERE rowid IN ('
+                        ' SELECT rowid FROM records'
+                        ' ORDER BY seen_at LIMIT ?)',
+                        (count - self.max_entries,)).rowcount
+
+            self.connection.commit()
+
+        if evicted:
+            LOGGER.info('Evicted {} entries from the dedup store.'
+                        .format(evicted))
+
+    def commit(self):
+        with self.lock:
+            self.connection.commit()
+
+
+class DedupFilter:
+    """A batch transform that drops records whose key and content are
+    both in `store` already.
+
+    It runs under the output lock until its records are written, or a
+    STATE message from another stream could commit them to the store
+    before they're out."""
+
+    batch = True
+    phase = 'dedup'
+    locks_output = True
+
+    def __init__(self, store, stream, key_properties):
+        self.store = store
+        self.stream = stream
+        self.key_properties = key_properties
+        self.dropped = 0
+
+    def __call__(self, records):
+        changes = self.store.changes(
+            self.stream,
+            [get_key(record, self.key_properties) for record in records],
+            [get_content_hash(record) for record in records])
+
+        kept = []
+
+        for record, change in zip(records, changes):
+            if change is None:
+                self.dropped = self.dropped + 1
+            else:
+                self.handle(record, change)
+                kept.append(record)
+
+        return kept
+
+    def handle(self, record, change):
+        """Called with each record that's kept, and whether it's NEW or
+        CHANGED."""
+        pass
+
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_dedup_store(config, path):
+    """Returns the process-wide store kept at `path`."""
+    with _STORES_LOCK:
+        if path not in _STORES:
+            ttl_days = config.get('dedup_ttl_days', 30)
+            max_entries = config.get('dedup_max_entries', 10000000)
+
+            _STORES[path] = DedupStore(
+                path,
+                ttl=float(ttl_days) * 86400 if ttl_days else None,
+                max_entries=int(max_entries) if max_entries else None)
+
+        return _STORES[path]
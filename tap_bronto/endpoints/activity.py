@@ -0,0 +1,268 @@
+from tap_bronto.client import is_end_of_results, TIMEOUT
+from tap_bronto.dedup import DedupFilter, NEW
+from tap_bronto.ids import get_activity_id_deriver
+from tap_bronto.schemas import get_field_selector, ACTIVITY_SCHEMA
+from tap_bronto.output import write_schema
+from tap_bronto.pipeline import deserialize, get_high_water_mark
+from tap_bronto.profiling import profiled
+from tap_bronto.state import to_utc
+from tap_bronto.stream import Stream
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytz
+import singer
+import suds
+
+LOGGER = singer.get_logger()  # noqa
+
+
+class LatenessFilter(DedupFilter):
+    """A DedupFilter that also measures how late new activities arrived.
+
+    An activity dated before `bookmark` wasn't there when the last run
+    read past that date, so it turned up at least `bookmark - createdDate`
+    late. The most of those is kept in `lateness`."""
+
+    def __init__(self, store, stream, key_properties, bookmark):
+        super().__init__(store, stream, key_properties)
+        self.bookmark = bookmark
+        self.lateness = timedelta(0)
+
+    def handle(self, record, change):
+        if change != NEW or self.bookmark is None:
+            return
+
+        created = datetime.fromisoformat(record['createdDate'])
+
+        if created.tzinfo is None:
+            created = pytz.utc.localize(created)
+
+        if created < self.bookmark:
+            self.lateness = max(self.lateness, self.bookmark - created)
+
+
+class ActivityStream(Stream):
+    """The readRecent*Activities endpoints, which page with a cursor:
+    the first call for a window reads FIRST and each later one NEXT,
+    until Bronto says there are no more results.
+
+    Bronto keeps the cursor with the session, so pages have to be read
+    one after another. While a page is being transformed and written,
+    the next one is already being read on a background thread.
+
+    Activities can show up after their createdDate, so each run starts
+    a while before the bookmark: `activity_rewind_hours`, or with the
+    `dedup_store` option, twice the lateness seen recently (halving each
+    run nothing arrives late, never more than `activity_rewind_hours` or
+    less than `activity_min_rewind_hours`).
+
+    A tuned rewind can't see activities later than itself, so it would
+    never learn to grow. Every `activity_full_rewind_runs` runs, the
+    whole `activity_rewind_hours` is read again to look for them."""
+
+    KEY_PROPERTIES = ['id']
+    SCHEMA = ACTIVITY_SCHEMA
+    WINDOW_INTERVAL = timedelta(hours=1)
+
+    NAME = None
+    SEARCH_REQUEST = None
+    READ_METHOD = None
+
+    def make_filter(self, start, end):
+        _filter = self.client.factory.create(self.SEARCH_REQUEST)
+        _filter.start = start
+        _filter.end = end
+        _filter.size = 5000
+        _filter.readDirection = 'FIRST'
+
+        return _filter
+
+    def get_max_rewind(self):
+        return timedelta(
+            hours=float(self.config.get('activity_rewind_hours', 72)))
+
+    def get_min_rewind(self):
+        return timedelta(
+            hours=float(self.config.get('activity_min_rewind_hours', 24)))
+
+    def get_full_rewind_runs(self):
+        return int(self.config.get('activity_full_rewind_runs', 24))
+
+    def get_dedup_filter(self, store):
+        # With nothing stored yet, every activity would look late.
+        bookmark = (self.bookmarks.get(self.TABLE)
+                    if store.has_entries(self.name) else None)
+
+        return LatenessFilter(store, self.name, self.get_key_properties(),
+                              bookmark)
+
+    def get_rewind(self, table):
+        rewind = self.get_max_rewind()
+
+        if self.config.get('dedup_store') is not None:
+            rewind_seconds = self.bookmarks.get_extra(table, 'rewind_seconds')
+            runs = self.bookmarks.get_extra(table, 'runs_since_full_rewind',
+                                            0)
+
+            if rewind_seconds is not None and \
+                    runs + 1 < self.get_full_rewind_runs():
+                rewind = min(rewind, timedelta(seconds=rewind_seconds))
+
+        return rewind
+
+    def get_next_rewind(self, rewind, lateness):
+        return max(self.get_min_rewind(),
+                   min(self.get_max_rewind(), max(2 * lateness, rewind / 2)))
+
+    def save_rewind(self, table, rewind, lateness):
+        """Keeps the rewind for the next run in the bookmark, given this
+        run's `rewind` and the `lateness` it saw."""
+        next_rewind = self.get_next_rewind(rewind, lateness)
+
+        if rewind >= self.get_max_rewind():
+            runs = 0
+        else:
+            runs = self.bookmarks.get_extra(
+                table, 'runs_since_full_rewind', 0) + 1
+
+        LOGGER.info('Latest {} arrived {} late; rewinding {} next time.'
+                    .format(self.NAME, lateness, next_rewind))
+
+        self.bookmarks.set_extra(table, 'rewind_seconds',
+                                 int(next_rewind.total_seconds()))
+        self.bookmarks.set_extra(table, 'runs_since_full_rewind', runs)
+
+    def get_start_date(self, table, rewind=timedelta(days=3)):
+        start = super().get_start_date(table)
+
+        earliest_available = datetime.now(pytz.utc) - timedelta(days=30)
+
+        if earliest_available > start:
+            LOGGER.warn('Start date before 30 days ago, but Bronto '
+                        'only returns the past 30 days of activity. '
+                        'Using a start date of -30 days.')
+            return earliest_available
+        else:
+            LOGGER.info('Rewinding {}, since activities can change...'
+                        .format(rewind))
+
+        return max(earliest_available, start - rewind)
+
+    def read_page(self, _filter):
+        """Returns the next page, or [] once there are no more. Failed
+        reads aren't retried here; see read_pages()."""
+        try:
+            return self.session.read(self.READ_METHOD, _filter, retry=False)
+        except suds.WebFault as e:
+            if is_end_of_results(e):
+                return []
+
+            raise
+
+    def read_pages(self, start, end, executor, latest=None):
+        """Yields (results, latest) for each page of activities from
+        `latest`, or else `start`, up to `end`, where `latest` is the
+        latest createdDate read so far. The next page is read on
+        `executor` while the caller handles this one.
+
+        A NEXT read can't be retried as it is: its cursor belongs to the
+        session, which is gone if it expired, and after a timeout Bronto
+        may already have moved past the page. Instead, after any failed
+        read, reading starts over with FIRST from `latest`, repeating
+        only the activities created in that second. This is the only
+        retry loop, so each page gets at most `max_retries` retries."""
+        read_page = profiled(self.read_page)
+        _filter = self.make_filter(latest or start, end)
+        future = executor.submit(read_page, _filter)
+        attempt = 0
+
+        while True:
+            try:
+                results = future.result()
+
+            except Exception as error:
+                attempt = attempt + 1
+                self.session.recover(self.READ_METHOD, error, attempt)
+
+                LOGGER.info('Reading {} again from {}.'.format(
+                    self.NAME, latest or start))
+
+                _filter = self.make_filter(latest or start, end)
+                future = executor.submit(read_page, _filter)
+                continue
+
+            if len(results) == 0:
+                return
+
+            attempt = 0
+            latest = get_high_water_mark(results, 'createdDate', latest)
+
+            # The previous read is done with the filter, so it's safe to
+            # change it for the next.
+            _filter.readDirection = 'NEXT'
+            future = executor.submit(read_page, _filter)
+
+            yield results, latest
+
+    def sync(self):
+        key_properties = self.catalog.get('key_properties')
+        table = self.TABLE
+
+        write_schema(
+            self.catalog.get('stream'),
+            self.catalog.get('schema'),
+            key_properties=key_properties)
+
+        rewind = self.get_rewind(table)
+        start = self.get_start_date(table, rewind)
+        planner = self.get_window_planner()
+
+        pipeline = self.get_pipeline([
+            deserialize,
+            get_field_selector(self.catalog.get('schema')),
+            get_activity_id_deriver(self.config),
+        ])
+
+        LOGGER.info('Syncing {}.'.format(self.NAME))
+
+        self.login()
+
+        with ThreadPoolExecutor(max_workers=1,
+                                thread_name_prefix=table) as executor:
+            for start, end, resume in self.get_windows(planner, start):
+                LOGGER.info("Fetching activities from {} to {}".format(
+                    start, end))
+
+                position = resume.get('position')
+                latest = None if position is None else to_utc(position)
+
+                rows = 0
+                calls = 1
+                timeouts = self.session.retries[TIMEOUT]
+
+                for results, latest in self.read_pages(start, end, executor,
+                                                       latest):
+                    calls = calls + 1
+                    rows = rows + len(results)
+
+                    pipeline.emit(results)
+
+                    LOGGER.info('... {} results'.format(len(results)))
+
+                    # Activities come back in createdDate order, so a later
+                    # run can also pick up from the latest one read.
+                    self.save_progress('createdDate', start, end,
+                                       len(results),
+                                       position=latest and latest.isoformat())
+
+                planner.record(rows, calls,
+                               self.session.retries[TIMEOUT] - timeouts)
+
+                self.save_window('createdDate', latest)
+
+        if self.dedup_filter is not None:
+            self.save_rewind(table, rewind, self.dedup_filter.lateness)
+
+        LOGGER.info('Done syncing {}.'.format(self.NAME))
@@ -1,24 +1,58 @@
+from tap_bronto.client import SessionPool, TIMEOUT
 from tap_bronto.schemas import get_field_selector, is_selected, \
     CONTACT_SCHEMA
-from tap_bronto.state import incorporate, save_state
+from tap_bronto.output import write_schema
+from tap_bronto.pipeline import deserialize, get_high_water_mark
+from tap_bronto.profiling import profiled
+from tap_bronto.state import to_utc
 from tap_bronto.stream import Stream
+from tap_bronto.windows import WindowPlanner
 from funcy import project
 
-from datetime import datetime, timedelta
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import partial
 
-import pytz
 import singer
-import socket
-import suds
 
 LOGGER = singer.get_logger()  # noqa
 
 
+def flatten(item):
+    read_only_data = item.pop('readOnlyContactData', None) or {}
+    return {**item, **deserialize(read_only_data)}
+
+
+class ModifiedSince:
+    """Drops contacts modified before `start`."""
+
+    batch = True
+    phase = 'trim'
+
+    def __init__(self, start):
+        self.start = start
+
+    def __call__(self, records):
+        return [record for record in records
+                if record.get('modified') is None or
+                to_utc(record['modified']) >= self.start]
+
+
 class ContactStream(Stream):
+    """readContacts, in windows of contacts by modified date.
+
+    Bronto's AfterOrSameDay matches from midnight of the given day, so
+    windows are whole UTC days: each starts where the last one ended,
+    and no contact is read twice in a run. Once a window is read, the
+    bookmark moves to the latest modified date in it. The next run starts
+    at midnight before the bookmark, dropping the contacts from before it
+    rather than emitting them again."""
 
     TABLE = 'contact'
     KEY_PROPERTIES = ['id']
     SCHEMA = CONTACT_SCHEMA
+    WINDOW_INTERVAL = timedelta(days=1)
 
     def make_filter(self, start, end):
         start_filter = self.client.factory.create('dateValue')
@@ -35,25 +69,16 @@ class ContactStream(Stream):
 
         return _filter
 
+    def get_window_planner(self):
+        return WindowPlanner.from_config(self.config, self.WINDOW_INTERVAL,
+                                         granularity=timedelta(days=1))
+
     def any_selected(self, field_names):
         sub_catalog = project(field_names, self.catalog.get('schema'))
         return any([is_selected(field_catalog)
                     for field_catalog in sub_catalog])
 
-    def sync(self):
-        key_properties = self.catalog.get('key_properties')
-        table = self.TABLE
-
-        singer.write_schema(
-            self.catalog.get('stream'),
-            self.catalog.get('schema'),
-            key_properties=key_properties)
-
-        self.login()
-
-        field_selector = get_field_selector(
-            self.catalog.get('schema'))
-
+    def get_read_options(self):
         includeGeoIpData = self.any_selected([
             'geoIPCity', 'geoIPStateRegion', 'geoIPZip',
             'geoIPCountry', 'geoIPCountryCode'
@@ -85,76 +110,159 @@ class ContactStream(Stream):
         if includeEngagementData:
             LOGGER.info('Including engagement data.')
 
-        LOGGER.info('Syncing contacts.')
+        return {
+            'includeLists': True,
+            'fields': [],
+            'includeSMSKeywords': True,
+            'includeGeoIpData': includeGeoIpData,
+            'includeTechnologyData': includeTechnologyData,
+            'includeRFMData': includeRFMData,
+            'includeEngagementData': includeEngagementData,
+        }
+
+    def read_page(self, _filter, read_options, session, pageNumber):
+        return session.read(
+            'readContacts',
+            filter=_filter,
+            pageNumber=pageNumber,
+            **read_options)
+
+    def sync_window(self, session, _filter, read_options, pipeline,
+                    fetcher, first_page=1, on_page=None):
+        """Reads every page of one window from `first_page`, calling
+        `on_page(pageNumber, count)` after each. Returns (rows, calls,
+        latest), where `latest` is the latest modified date read."""
+        rows = 0
+        calls = 1
+        latest = None
+
+        read_page = partial(self.read_page, _filter, read_options)
+
+        for pageNumber, results in fetcher.pages(read_page, session,
+                                                 first_page):
+            calls = calls + 1
+            rows = rows + len(results)
+            latest = get_high_water_mark(results, 'modified', latest)
+
+            LOGGER.info("... page {}: {} results".format(
+                pageNumber, len(results)))
+
+            pipeline.emit(results)
+
+            if on_page is not None:
+                on_page(pageNumber, len(results))
+
+        return rows, calls, latest
+
+    def sync_windows_concurrently(self, start, planner, read_options,
+                                  pipeline, fetcher, workers):
+        """Fetches windows on `workers` sessions at once. The bookmark
+        only moves past a window once it and every earlier window have
+        finished, so a failed run never skips data.
+
+        Windows are queued before earlier ones return, so they keep the
+        planner's initial size rather than adapting, and progress is only
+        saved per window, not per page."""
+        pool = SessionPool(self.config, workers, self.metrics)
+        pending = deque()
+
+        def fetch(_filter, first_page):
+            with pool.session() as session:
+                rows, _, latest = self.sync_window(
+                    session, _filter, read_options, pipeline, fetcher,
+                    first_page)
+                return rows, latest
+
+        def checkpoint(wait):
+            if wait:
+                pending[0].result()
+
+            finished = False
+            latest = None
+            rows = 0
+
+            while pending and pending[0].done():
+                window_rows, window_latest = pending.popleft().result()
+                finished = True
+                latest = max(filter(None, [latest, window_latest]),
+                             default=None)
+                rows = rows + window_rows
+
+            if finished:
+                self.save_window('modified', latest, rows)
+
+        with ThreadPoolExecutor(max_workers=workers,
+                                thread_name_prefix='contact') as executor:
+            for start, end, resume in self.get_windows(planner, start):
+                LOGGER.info("Queueing contacts modified from {} to {}"
+                            .format(start, end))
+
+                _filter = self.make_filter(start, end)
+                pending.append(executor.submit(
+                    profiled(fetch), _filter, resume.get('page', 0) + 1))
+
+                checkpoint(wait=len(pending) >= 2 * workers)
+
+            while pending:
+                checkpoint(wait=True)
+
+    def sync(self):
+        key_properties = self.catalog.get('key_properties')
+        table = self.TABLE
+
+        write_schema(
+            self.catalog.get('stream'),
+            self.catalog.get('schema'),
+            key_properties=key_properties)
+
+        self.login()
 
         start = self.get_start_date(table)
-        end = start
-        interval = timedelta(hours=6)
-
-        def flatten(item):
-            read_only_data = item.get('readOnlyContactData', {})
-            item.pop('readOnlyContactData', None)
-            return {**item, **read_only_data}
-
-        while end < datetime.now(pytz.utc):
-            self.login()
-            start = end
-            end = start + interval
-            LOGGER.info("Fetching contacts modified from {} to {}".format(
-                start, end))
-
-            _filter = self.make_filter(start, end)
-            field_selector = get_field_selector(
-                self.catalog.get('schema'))
-
-            pageNumber = 1
-            hasMore = True
-
-            while hasMore:
-                retry_count = 0
-
-                self.login()
-
-                try:
-                    results = self.client.service.readContacts(
-                        filter=_filter,
-                        includeLists=True,
-                        fields=[],
-                        pageNumber=pageNumber,
-                        includeSMSKeywords=True,
-                        includeGeoIpData=includeGeoIpData,
-                        includeTechnologyData=includeTechnologyData,
-                        includeRFMData=includeRFMData,
-                        includeEngagementData=includeEngagementData)
-
-                except socket.timeout:
-                    retry_count += 1
-                    if retry_count >= 5:
-                        LOGGER.error("Retried more than five times, moving on!")
-                        raise
-                    LOGGER.warn("Timeout caught, retrying request")
-                    continue
-
-                pageNumber = pageNumber + 1
-
-                result_dicts = [suds.sudsobject.asdict(result)
-                                for result in results]
-
-                flattened = [flatten(result) for result in result_dicts]
-
-                LOGGER.info("... {} results".format(len(flattened)))
-
-                singer.write_records(
-                    table,
-                    [field_selector(result) for result in flattened])
-
-                if len(results) == 0:
-                    hasMore = False
-
-            self.state = incorporate(
-                self.state, table, 'modified',
-                start.replace(microsecond=0).isoformat())
-
-            save_state(self.state)
+        planner = self.get_window_planner()
+
+        transforms = [deserialize, flatten]
+
+        if planner.align(start) < start:
+            transforms.append(ModifiedSince(start))
+
+        pipeline = self.get_pipeline(transforms + [
+            get_field_selector(self.catalog.get('schema')),
+        ])
+
+        read_options = self.get_read_options()
+
+        LOGGER.info('Syncing contacts.')
+
+        workers = int(self.config.get('contact_window_workers', 1))
+
+        with self.get_page_fetcher() as fetcher:
+            if workers > 1:
+                LOGGER.info('Fetching contact windows on {} sessions.'
+                            .format(workers))
+                self.sync_windows_concurrently(
+                    start, planner, read_options, pipeline, fetcher,
+                    workers)
+
+                LOGGER.info("Done syncing contacts.")
+                return
+
+            for start, end, resume in self.get_windows(planner, start):
+                LOGGER.info("Fetching contacts modified from {} to {}"
+                            .format(start, end))
+
+                _filter = self.make_filter(start, end)
+                timeouts = self.session.retries[TIMEOUT]
+
+                def save_page(pageNumber, count, start=start, end=end):
+                    self.save_progress('modified', start, end, count,
+                                       page=pageNumber)
+
+                rows, calls, latest = self.sync_window(
+                    self.session, _filter, read_options, pipeline,
+                    fetcher, resume.get('page', 0) + 1, save_page)
+                planner.record(rows, calls,
+                               self.session.retries[TIMEOUT] - timeouts)
+
+                self.save_window('modified', latest)
 
         LOGGER.info("Done syncing contacts.")
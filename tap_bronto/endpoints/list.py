@@ -1,8 +1,9 @@
 from tap_bronto.schemas import with_properties, get_field_selector
+from tap_bronto.output import write_schema
+from tap_bronto.pipeline import deserialize
 from tap_bronto.stream import Stream
 
 import singer
-import suds
 
 LOGGER = singer.get_logger()  # noqa
 
@@ -55,45 +56,38 @@ class ListStream(Stream):
         }
     })
 
+    def read_page(self, session, pageNumber):
+        return session.read(
+            'readLists',
+            1,  # weird hack -- this just happens to work if we
+                # pass 1 as the filter. Other values like None
+                # did not work
+            pageNumber,
+            5000)
+
     def sync(self):
         key_properties = self.catalog.get('key_properties')
-        table = self.TABLE
 
-        singer.write_schema(
+        write_schema(
             self.catalog.get('stream'),
             self.catalog.get('schema'),
             key_properties=key_properties)
 
         self.login()
 
-        hasMore = True
-        pageNumber = 1
-        field_selector = get_field_selector(
-            self.catalog.get('schema'))
+        pipeline = self.get_pipeline([
+            deserialize,
+            get_field_selector(self.catalog.get('schema')),
+        ])
 
         LOGGER.info('Syncing lists.')
 
-        while hasMore:
-            self.login()
-
-            LOGGER.info("... page {}".format(pageNumber))
-            results = self.client.service.readLists(
-                1,  # weird hack -- this just happens to work if we
-                    # pass 1 as the filter. Other values like None
-                    # did not work
-                pageNumber,
-                5000)
-
-            LOGGER.info("... {} results".format(len(results)))
-
-            pageNumber = pageNumber + 1
-
-            singer.write_records(
-                table,
-                [field_selector(suds.sudsobject.asdict(result))
-                 for result in results])
+        with self.get_page_fetcher() as fetcher:
+            for pageNumber, results in fetcher.pages(self.read_page,
+                                                     self.session):
+                LOGGER.info("... page {}: {} results".format(
+                    pageNumber, len(results)))
 
-            if len(results) == 0:
-                hasMore = False
+                pipeline.emit(results)
 
         LOGGER.info("Done syncing lists.")
@@ -1,12 +1,13 @@
+from tap_bronto.client import TIMEOUT
 from tap_bronto.schemas import with_properties, get_field_selector
-from tap_bronto.state import incorporate, save_state
+from tap_bronto.output import write_schema
+from tap_bronto.pipeline import deserialize, get_high_water_mark
 from tap_bronto.stream import Stream
 
-from datetime import datetime, timedelta
+from datetime import timedelta
+from functools import partial
 
-import pytz
 import singer
-import suds
 
 LOGGER = singer.get_logger()  # noqa
 
@@ -15,6 +16,7 @@ class UnsubscribeStream(Stream):
 
     TABLE = 'unsubscribe'
     KEY_PROPERTIES = ['contactId', 'method', 'created']
+    WINDOW_INTERVAL = timedelta(hours=6)
     SCHEMA = with_properties({
         'contactId': {
             'type': ['string'],
@@ -68,58 +70,58 @@ class UnsubscribeStream(Stream):
         _filter.end = end
         return _filter
 
+    def read_page(self, _filter, session, pageNumber):
+        return session.read('readUnsubscribes', _filter, pageNumber)
+
     def sync(self):
         key_properties = self.catalog.get('key_properties')
         table = self.TABLE
 
-        singer.write_schema(
+        write_schema(
             self.catalog.get('stream'),
             self.catalog.get('schema'),
             key_properties=key_properties)
 
         start = self.get_start_date(table)
-        end = start
-        interval = timedelta(hours=6)
+        planner = self.get_window_planner()
+        pipeline = self.get_pipeline([
+            deserialize,
+            get_field_selector(self.catalog.get('schema')),
+        ])
 
         LOGGER.info('Syncing unsubscribes.')
 
-        while end < datetime.now(pytz.utc):
-            self.login()
-            start = end
-            end = start + interval
-            LOGGER.info("Fetching unsubscribes from {} to {}".format(
-                start, end))
+        self.login()
 
-            hasMore = True
-            _filter = self.make_filter(start, end)
-            pageNumber = 1
+        with self.get_page_fetcher() as fetcher:
+            for start, end, resume in self.get_windows(planner, start):
+                LOGGER.info("Fetching unsubscribes from {} to {}".format(
+                    start, end))
 
-            field_selector = get_field_selector(
-                self.catalog.get('schema'))
+                read_page = partial(self.read_page,
+                                    self.make_filter(start, end))
+                rows = 0
+                calls = 1
+                timeouts = self.session.retries[TIMEOUT]
+                latest = None
 
-            while hasMore:
-                self.login()
-                LOGGER.info("... page {}".format(pageNumber))
-                results = self.client.service.readUnsubscribes(
-                    _filter, pageNumber)
-                pageNumber = pageNumber + 1
+                for pageNumber, results in fetcher.pages(
+                        read_page, self.session, resume.get('page', 0) + 1):
+                    calls = calls + 1
+                    rows = rows + len(results)
+                    latest = get_high_water_mark(results, 'created', latest)
 
-                singer.write_records(
-                    table,
-                    [field_selector(suds.sudsobject.asdict(result))
-                     for result in results])
+                    pipeline.emit(results)
 
-                LOGGER.info("... {} results".format(len(results)))
+                    LOGGER.info("... page {}: {} results".format(
+                        pageNumber, len(results)))
 
-                if len(results) == 0:
-                    hasMore = False
+                    self.save_progress('created', start, end,
+                                       len(results), page=pageNumber)
 
-                self.state = incorporate(
-                    self.state,
-                    table,
-                    'start_date',
-                    start.isoformat())
+                self.save_window('created', latest)
 
-                save_state(self.state)
+                planner.record(rows, calls,
+                               self.session.retries[TIMEOUT] - timeouts)
 
         LOGGER.info("Done syncing unsubscribes.")
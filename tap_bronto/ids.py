@@ -0,0 +1,68 @@
+import hashlib
+
+from functools import partial
+
+import singer
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+LOGGER = singer.get_logger()  # noqa
+
+# Bronto doesn't give activities an ID, so we make one from these.
+ACTIVITY_ID_FIELDS = ('createdDate', 'activityType', 'contactId',
+                      'listId', 'segmentId', 'keywordId', 'messageId')
+
+DEFAULT_HASH = 'md5'
+
+HASHES = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    # 16 bytes, so IDs stay 32 hex digits like MD5's.
+    'blake2b': partial(hashlib.blake2b, digest_size=16),
+}
+
+if xxhash is not None:
+    HASHES.update({
+        'xxh64': xxhash.xxh64,
+        'xxh128': xxhash.xxh3_128,
+    })
+
+
+class IdDeriver:
+    """Sets each record's `id` to a hash of the non-empty values of
+    `fields`, joined with '|'.
+
+    Called with a whole batch of records at once. With the default MD5
+    the IDs are the ones tap-bronto has always generated; any other
+    hash changes every activity's ID, so only switch on a fresh table."""
+
+    batch = True
+    phase = 'derive_id'
+
+    def __init__(self, fields, algorithm=DEFAULT_HASH):
+        if algorithm not in HASHES:
+            raise RuntimeError(
+                'Unknown ID hash {}. Available: {}'.format(
+                    algorithm, ', '.join(sorted(HASHES))))
+
+        self.fields = tuple(fields)
+        self.algorithm = algorithm
+
+    def __call__(self, records):
+        get_hash = HASHES[self.algorithm]
+        fields = self.fields
+
+        for record in records:
+            values = [value for value in map(record.get, fields) if value]
+            record['id'] = get_hash(
+                '|'.join(values).encode('utf-8')).hexdigest()
+
+        return records
+
+
+def get_activity_id_deriver(config):
+    return IdDeriver(ACTIVITY_ID_FIELDS,
+                     config.get('activity_id_hash', DEFAULT_HASH))
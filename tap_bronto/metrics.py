@@ -0,0 +1,116 @@
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+
+import singer
+import singer.metrics
+
+LOGGER = singer.get_logger()  # noqa
+
+PHASE_DURATION = 'phase_duration'
+PHASE_COUNT = 'phase_count'
+
+# Phases timed around the API, as opposed to the record transforms,
+# which are named after the transform function.
+LOGIN = 'login'
+SOAP_CALL = 'soap_call'
+DECODE = 'decode'
+WRITE = 'write'
+# Waiting on transform processes, which run every transform at once.
+TRANSFORM = 'transform'
+
+
+class StreamMetrics:
+    """Time spent and work done in each phase of one stream's sync.
+
+    Every `log_interval` seconds, and again by flush(), the totals since
+    the last report are logged as singer METRIC messages: a timer with
+    the seconds spent in each phase, a counter with how many times it
+    ran (calls, or records for per-record phases), and the standard
+    record_count. The running totals are kept for summary()."""
+
+    def __init__(self, stream,
+                 log_interval=singer.metrics.DEFAULT_LOG_INTERVAL):
+        self.stream = stream
+        self.log_interval = log_interval
+        self.lock = threading.Lock()
+        self.seconds = Counter()
+        self.counts = Counter()
+        self.records = 0
+        self.pending_seconds = Counter()
+        self.pending_counts = Counter()
+        self.pending_records = 0
+        self.last_log_time = time.monotonic()
+
+    def add(self, phase, seconds, count=1):
+        with self.lock:
+            self.seconds[phase] += seconds
+            self.counts[phase] += count
+            self.pending_seconds[phase] += seconds
+            self.pending_counts[phase] += count
+
+        self.maybe_flush()
+
+    def add_records(self, count):
+        with self.lock:
+            self.records += count
+            self.pending_records += count
+
+    @contextmanager
+    def timer(self, phase, count=1):
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - started, count)
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_log_time > self.log_interval:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            seconds, self.pending_seconds = self.pending_seconds, Counter()
+            counts, self.pending_counts = self.pending_counts, Counter()
+            records, self.pending_records = self.pending_records, 0
+            self.last_log_time = time.monotonic()
+
+        for phase in sorted(counts):
+            tags = {singer.metrics.Tag.endpoint: self.stream, 'phase': phase}
+
+            singer.metrics.log(LOGGER, singer.metrics.Point(
+                'timer', PHASE_DURATION, round(seconds[phase], 6), tags))
+            singer.metrics.log(LOGGER, singer.metrics.Point(
+                'counter', PHASE_COUNT, counts[phase], tags))
+
+        if records:
+            singer.metrics.log(LOGGER, singer.metrics.Point(
+                'counter', singer.metrics.Metric.record_count, records,
+                {singer.metrics.Tag.endpoint: self.stream}))
+
+    def summary(self):
+        """Returns [(phase, seconds, count)], slowest phase first."""
+        with self.lock:
+            return sorted(((phase, self.seconds[phase], self.counts[phase])
+                           for phase in self.counts),
+                          key=lambda phase: -phase[1])
+
+
+def log_summary(stream_metrics):
+    """Logs where each stream spent its time over the whole run."""
+    for metrics in stream_metrics:
+        phases = metrics.summary()
+
+        if not phases:
+            continue
+
+        LOGGER.info('Time spent syncing {} ({} records):'
+                    .format(metrics.stream, metrics.records))
+
+        for phase, seconds, count in phases:
+            LOGGER.info('  {:<12} {:>10.2f}s {:>10} x {:>9.3f}ms'
+                        .format(phase, seconds, count,
+                                1000 * seconds / max(count, 1)))
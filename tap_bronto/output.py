@@ -0,0 +1,146 @@
+import atexit
+import sys
+import threading
+
+import singer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOGGER = singer.get_logger()  # noqa
+
+# Streams may sync concurrently, so every message is written while
+# holding this lock. That keeps each message (and each page of records)
+# contiguous on stdout.
+OUTPUT_LOCK = threading.RLock()
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+class MessageWriter:
+    """Writes singer messages to stdout through a buffer of up to
+    `buffer_size` bytes, instead of writing and flushing each one.
+
+    The buffer is flushed whenever it fills and after every STATE
+    message, so a target never sees a bookmark before the records it
+    covers. Messages are encoded with orjson when it is installed and
+    `use_orjson` is set; anything orjson can't encode (Decimals, say)
+    falls back to singer's own encoder."""
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE, use_orjson=True,
+                 stream=None):
+        self.buffer_size = max(0, int(buffer_size))
+        self.use_orjson = use_orjson and orjson is not None
+        self.stream = stream
+        self.buffer = []
+        self.buffered = 0
+
+    def get_stream(self):
+        if self.stream is None:
+            # Anything already written through sys.stdout goes first.
+            sys.stdout.flush()
+            return sys.stdout.buffer
+
+        return self.stream
+
+    def encode(self, message):
+        if self.use_orjson:
+            try:
+                return orjson.dumps(message.asdict(),
+                                    option=orjson.OPT_APPEND_NEWLINE)
+            except TypeError:
+                pass
+
+        return (singer.format_message(message) + '\n').encode('utf-8')
+
+    def write(self, messages):
+        with OUTPUT_LOCK:
+            for message in messages:
+                line = self.encode(message)
+                self.buffer.append(line)
+                self.buffered = self.buffered + len(line)
+
+            if self.buffered >= self.buffer_size:
+                self.flush()
+
+    def write_encoded(self, data):
+        """Writes messages that were already encoded, as bytes."""
+        with OUTPUT_LOCK:
+            self.buffer.append(data)
+            self.buffered = self.buffered + len(data)
+
+            if self.buffered >= self.buffer_size:
+                self.flush()
+
+    def flush(self):
+        with OUTPUT_LOCK:
+            if not self.buffer:
+                return
+
+            stream = self.get_stream()
+            stream.write(b''.join(self.buffer))
+            stream.flush()
+
+            self.buffer = []
+            self.buffered = 0
+
+
+WRITER = MessageWriter()
+
+atexit.register(lambda: WRITER.flush())
+
+
+def configure(config):
+    """Sets up output from the tap's config. Call before writing."""
+    global WRITER
+
+    with OUTPUT_LOCK:
+        WRITER.flush()
+        WRITER = MessageWriter(
+            buffer_size=config.get('output_buffer_size',
+                                   DEFAULT_BUFFER_SIZE),
+            use_orjson=config.get('output_orjson', True))
+
+    if WRITER.use_orjson:
+        LOGGER.info('Encoding output with orjson.')
+
+
+def write_schema(stream, schema, key_properties):
+    WRITER.write([singer.SchemaMessage(
+        stream=stream, schema=schema, key_properties=key_properties)])
+
+
+def write_records(stream, records):
+    WRITER.write(singer.RecordMessage(stream=stream, record=record)
+                 for record in records)
+
+
+def encode_records(stream, records, use_orjson=True):
+    """Returns RECORD messages for `records`, encoded the way they would
+    be written. Doesn't touch the output, so can run in another process
+    to be written with write_encoded()."""
+    writer = MessageWriter(use_orjson=use_orjson)
+
+    return b''.join(
+        writer.encode(singer.RecordMessage(stream=stream, record=record))
+        for record in records)
+
+
+def write_encoded(data):
+    WRITER.write_encoded(data)
+
+
+def uses_orjson():
+    return WRITER.use_orjson
+
+
+def write_state(state):
+    with OUTPUT_LOCK:
+        WRITER.write([singer.StateMessage(value=state)])
+        WRITER.flush()
+
+
+def flush():
+    WRITER.flush()
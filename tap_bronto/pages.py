@@ -0,0 +1,90 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import singer
+
+from tap_bronto.client import SessionPool
+from tap_bronto.profiling import profiled
+
+LOGGER = singer.get_logger()  # noqa
+
+
+class PageFetcher:
+    """Reads the pages of a pageNumber-paged call (readContacts,
+    readUnsubscribes, readLists) until one comes back empty.
+
+    With a concurrency of 1, pages are read one at a time on the
+    caller's session. Above that, pages k..k+concurrency-1 are in flight
+    at once, each on its own session from a pool, and are still handed
+    back in page order. Up to concurrency-1 reads past the last page are
+    wasted, so this pays off for calls that usually run to several
+    pages. A fetcher can be shared by threads."""
+
+    def __init__(self, config, concurrency=1, metrics=None):
+        self.concurrency = max(1, int(concurrency))
+        self.pool = None
+        self.executor = None
+
+        if self.concurrency > 1:
+            self.pool = SessionPool(config, self.concurrency, metrics)
+            self.executor = ThreadPoolExecutor(
+                max_workers=self.concurrency, thread_name_prefix='page')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+
+    def read(self, read_page, page_number):
+        with self.pool.session() as session:
+            return read_page(session, page_number)
+
+    def pages(self, read_page, session, first_page=1):
+        """Yields (pageNumber, results) for each non-empty page, from
+        `first_page` on. `read_page(session, pageNumber)` reads one."""
+        if self.executor is None:
+            page_number = first_page
+
+            while True:
+                results = read_page(session, page_number)
+
+                if len(results) == 0:
+                    return
+
+                yield page_number, results
+
+                page_number = page_number + 1
+
+        pending = deque()
+        next_page = first_page
+
+        def submit():
+            nonlocal next_page
+
+            pending.append((next_page, self.executor.submit(
+                profiled(self.read), read_page, next_page)))
+            next_page = next_page + 1
+
+        for _ in range(self.concurrency):
+            submit()
+
+        try:
+            while True:
+                page_number, future = pending.popleft()
+                results = future.result()
+
+                if len(results) == 0:
+                    return
+
+                submit()
+
+                yield page_number, results
+
+        finally:
+            for _, future in pending:
+                future.cancel()
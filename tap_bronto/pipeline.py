@@ -0,0 +1,198 @@
+import multiprocessing
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import singer
+import suds
+
+from tap_bronto.metrics import StreamMetrics, TRANSFORM, WRITE
+from tap_bronto.output import encode_records, uses_orjson, \
+    write_encoded, write_records, OUTPUT_LOCK
+from tap_bronto.state import to_utc
+
+LOGGER = singer.get_logger()  # noqa
+
+_POOLS = {}
+_POOLS_LOCK = threading.Lock()
+
+
+def to_plain(value):
+    """Turns suds objects in `value`, however deeply nested, into dicts."""
+    if isinstance(value, suds.sudsobject.Object):
+        return {key: to_plain(item)
+                for key, item in suds.sudsobject.asdict(value).items()}
+
+    if isinstance(value, list):
+        return [to_plain(item) for item in value]
+
+    return value
+
+
+def deserialize(result):
+    """Returns an API result as a dict, with nested objects as dicts too,
+    the way the fast decoder returns them."""
+    # Records from the fast decoder are already dicts.
+    if isinstance(result, dict):
+        return result
+
+    return to_plain(result)
+
+
+def get_high_water_mark(results, field, current=None):
+    """Returns the latest `field` in API `results`, or `current` if that's
+    later, as a UTC datetime. None if there are none at all. Bronto leaves
+    the timezone off some dates; those are UTC."""
+    values = [result.get(field) if isinstance(result, dict)
+              else getattr(result, field, None)
+              for result in results]
+
+    return max([to_utc(value) for value in values if value is not None] +
+               ([current] if current is not None else []),
+               default=None)
+
+
+def transform_and_encode(table, transforms, batch, use_orjson):
+    """Runs in a transform process. Returns how many records `batch`
+    became, and their RECORD messages, ready to write."""
+    for transform in transforms:
+        if getattr(transform, 'batch', False):
+            batch = transform(batch)
+        else:
+            batch = [transform(record) for record in batch]
+
+    return len(batch), encode_records(table, batch, use_orjson)
+
+
+def get_process_pool(processes):
+    """Returns the process-wide pool of `processes` transform processes.
+    They're spawned rather than forked, so they don't inherit the tap's
+    threads."""
+    with _POOLS_LOCK:
+        if processes not in _POOLS:
+            LOGGER.info('Transforming records in {} processes.'
+                        .format(processes))
+
+            _POOLS[processes] = ProcessPoolExecutor(
+                max_workers=processes,
+                mp_context=multiprocessing.get_context('spawn'))
+
+        return _POOLS[processes]
+
+
+class RecordPipeline:
+    """Transforms and writes API results, `buffer_size` at a time.
+
+    Each transform takes a record and returns the new record, or, if it
+    has a true `batch` attribute, takes and returns a list of records.
+    Results are taken in batches of at most `buffer_size`, and each
+    transform is applied to a whole batch before the next, so `metrics`
+    can time every transform (by its `phase`, or else its function name)
+    and the write without a clock call per record.
+
+    A transform with a true `locks_output` attribute runs, along with
+    every transform after it and the write, while holding the output
+    lock, so nothing else can write (or emit STATE) in between.
+
+    With a process pool as `executor`, each batch is instead transformed
+    and encoded in another process, and this process only writes the
+    result. Every transform must then be picklable and keep no state
+    this process needs. Batches are spread over the pool, so it pays to
+    have several per page."""
+
+    def __init__(self, table, transforms, buffer_size=1000, metrics=None,
+                 executor=None):
+        self.table = table
+        self.transforms = [
+            (getattr(transform, 'phase', None) or transform.__name__,
+             transform)
+            for transform in transforms]
+        self.buffer_size = max(1, int(buffer_size))
+        self.metrics = metrics or StreamMetrics(table)
+        self.executor = executor
+        self.locked_from = next(
+            (i for i, (_, transform) in enumerate(self.transforms)
+             if getattr(transform, 'locks_output', False)),
+            len(self.transforms))
+
+    def transform(self, batch, transforms=None):
+        if transforms is None:
+            transforms = self.transforms
+
+        for phase, transform in transforms:
+            started = time.perf_counter()
+
+            if getattr(transform, 'batch', False):
+                batch = transform(batch)
+            else:
+                batch = [transform(record) for record in batch]
+
+            self.metrics.add(phase, time.perf_counter() - started,
+                             len(batch))
+
+        return batch
+
+    def emit_in_processes(self, results):
+        transforms = [transform for _, transform in self.transforms]
+        use_orjson = uses_orjson()
+        futures = []
+
+        while True:
+            # suds objects can't be pickled.
+            batch = [deserialize(result)
+                     for result in islice(results, self.buffer_size)]
+
+            if not batch:
+                break
+
+            futures.append(self.executor.submit(
+                transform_and_encode, self.table, transforms, batch,
+                use_orjson))
+
+        count = 0
+
+        for future in futures:
+            started = time.perf_counter()
+            records, data = future.result()
+            self.metrics.add(TRANSFORM, time.perf_counter() - started,
+                             records)
+
+            with self.metrics.timer(WRITE, records):
+                write_encoded(data)
+
+            self.metrics.add_records(records)
+            count = count + records
+
+        return count
+
+    def emit(self, results):
+        """Writes every record in `results`. Returns how many."""
+        results = iter(results)
+
+        if self.executor is not None:
+            return self.emit_in_processes(results)
+
+        count = 0
+
+        while True:
+            batch = list(islice(results, self.buffer_size))
+
+            if not batch:
+                break
+
+            batch = self.transform(batch,
+                                   self.transforms[:self.locked_from])
+
+            with OUTPUT_LOCK:
+                batch = self.transform(batch,
+                                       self.transforms[self.locked_from:])
+
+                with self.metrics.timer(WRITE, len(batch)):
+                    write_records(self.table, batch)
+
+            self.metrics.add_records(len(batch))
+            count = count + len(batch)
+
+        return count
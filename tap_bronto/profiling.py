@@ -0,0 +1,263 @@
+import cProfile
+import functools
+import io
+import pstats
+import sys
+import threading
+import time
+
+from collections import Counter
+from contextlib import contextmanager
+
+import singer
+
+LOGGER = singer.get_logger()  # noqa
+
+CPROFILE = 'cprofile'
+SAMPLE = 'sample'
+MODES = [CPROFILE, SAMPLE]
+
+# Samples and profiles not taken inside a stream's sync.
+MAIN = 'main'
+
+# The one profile of the whole run, where streams can't have their own.
+ALL = 'all'
+
+TOP_FUNCTIONS = 40
+
+_PROFILER = None
+
+# The endpoint being profiled on each thread.
+_CURRENT = threading.local()
+
+
+class CProfiler:
+    """Deterministic profiling with cProfile.
+
+    Before Python 3.12, cProfile only sees the thread that enabled it,
+    so each stream's sync gets a profile of its own (see
+    profile_endpoint()), as does each task a stream hands to a thread of
+    its own (see profiled()), and the main thread has another. From 3.12
+    only one profile can be enabled at a time, and it sees every thread,
+    so there is just the one, for the whole run."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.profiles = {}
+        self.per_endpoint = sys.version_info < (3, 12)
+        self.local = threading.local()
+
+    def start(self):
+        if not self.per_endpoint:
+            LOGGER.info('cProfile can only run one profile at a time on '
+                        'this Python, so the profile isn\'t broken down '
+                        'by stream. The sample mode is.')
+
+        self.main = cProfile.Profile()
+        self.main.enable()
+
+    def stop(self):
+        self.main.disable()
+        self.add(MAIN if self.per_endpoint else ALL, self.main)
+
+    def add(self, endpoint, profile):
+        with self.lock:
+            self.profiles.setdefault(endpoint, []).append(profile)
+
+    @contextmanager
+    def profile_endpoint(self, endpoint):
+        if not self.per_endpoint or getattr(self.local, 'profiling', False):
+            yield
+            return
+
+        profile = cProfile.Profile()
+        profile.enable()
+        self.local.profiling = True
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            self.local.profiling = False
+            self.add(endpoint, profile)
+
+    def write(self):
+        with open(self.path, 'w') as handle:
+            for endpoint, profiles in sorted(self.profiles.items()):
+                report = io.StringIO()
+                stats = pstats.Stats(*profiles, stream=report)
+                stats.dump_stats('{}.{}.prof'.format(self.path, endpoint))
+                stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+
+                handle.write('=== {} ===\n'.format(endpoint))
+                handle.write(report.getvalue())
+                handle.write('\n')
+
+
+def describe(code):
+    return '{}:{}({})'.format(code.co_filename, code.co_firstlineno,
+                              code.co_name)
+
+
+class SamplingProfiler:
+    """Wall-clock sampling of every thread's stack, every `interval`
+    seconds, from a background thread. Cheap enough to leave on in
+    production, and it sees time spent waiting on Bronto as well as CPU.
+
+    Each sample is put down to the stream whose method is on the stack,
+    whichever thread it is running on."""
+
+    def __init__(self, path, interval=0.01):
+        self.path = path
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='profiler',
+                                       daemon=True)
+
+    def start(self):
+        self.started = time.monotonic()
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.elapsed = time.monotonic() - self.started
+
+    @contextmanager
+    def profile_endpoint(self, endpoint):
+        yield
+
+    def sample(self):
+        # tap_bronto.stream imports this module.
+        from tap_bronto.stream import Stream
+
+        own_ident = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+
+            stack = []
+            endpoint = MAIN
+
+            while frame is not None:
+                code = frame.f_code
+                stack.append(describe(code))
+
+                if endpoint == MAIN and code.co_varnames[:1] == ('self',):
+                    owner = frame.f_locals.get('self')
+
+                    if isinstance(owner, Stream):
+                        endpoint = owner.name
+
+                frame = frame.f_back
+
+            stack.reverse()
+            self.stacks[(endpoint, tuple(stack))] += 1
+            self.samples[endpoint] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def write(self):
+        inclusive = {}
+        exclusive = {}
+
+        for (endpoint, stack), count in self.stacks.items():
+            exclusive.setdefault(endpoint, Counter())[stack[-1]] += count
+
+            for function in set(stack):
+                inclusive.setdefault(endpoint, Counter())[function] += count
+
+        with open(self.path, 'w') as handle:
+            handle.write('{} samples every {}s over {:.1f}s\n\n'.format(
+                sum(self.samples.values()), self.interval, self.elapsed))
+
+            for endpoint, samples in self.samples.most_common():
+                handle.write('=== {} ({} samples) ===\n'
+                             .format(endpoint, samples))
+
+                for title, counts in [('self', exclusive[endpoint]),
+                                      ('total', inclusive[endpoint])]:
+                    handle.write('\n{:>8} {:>7}  function\n'
+                                 .format(title, '%'))
+
+                    for function, count in counts.most_common(TOP_FUNCTIONS):
+                        handle.write('{:>8} {:>6.1f}%  {}\n'.format(
+                            count, 100.0 * count / samples, function))
+
+                handle.write('\n')
+
+        # Collapsed stacks, as read by flamegraph.pl and speedscope.
+        with open(self.path + '.collapsed', 'w') as handle:
+            for (endpoint, stack), count in sorted(self.stacks.items()):
+                handle.write('{};{} {}\n'.format(
+                    endpoint, ';'.join(stack), count))
+
+
+@contextmanager
+def profile(path, mode=CPROFILE, interval=0.01):
+    """Profiles the body of the `with`, writing a report to `path`.
+    Does nothing if `path` is None."""
+    global _PROFILER
+
+    if path is None:
+        yield
+        return
+
+    if mode == SAMPLE:
+        _PROFILER = SamplingProfiler(path, interval)
+    else:
+        _PROFILER = CProfiler(path)
+
+    _PROFILER.start()
+
+    try:
+        yield
+    finally:
+        _PROFILER.stop()
+        _PROFILER.write()
+
+        LOGGER.info('Wrote {} profile to {}'.format(mode, path))
+
+        _PROFILER = None
+
+
+@contextmanager
+def profile_endpoint(endpoint):
+    """Attributes the body of the `with` to `endpoint`, when profiling."""
+    profiler = _PROFILER
+
+    if profiler is None:
+        yield
+        return
+
+    previous = getattr(_CURRENT, 'endpoint', None)
+    _CURRENT.endpoint = endpoint
+
+    try:
+        with profiler.profile_endpoint(endpoint):
+            yield
+    finally:
+        _CURRENT.endpoint = previous
+
+
+def profiled(function):
+    """Returns `function`, made to count towards the endpoint being
+    profiled on this thread wherever it runs. Wrap tasks handed to other
+    threads with this."""
+    endpoint = getattr(_CURRENT, 'endpoint', None)
+
+    if _PROFILER is None or endpoint is None:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with profile_endpoint(endpoint):
+            return function(*args, **kwargs)
+
+    return wrapper
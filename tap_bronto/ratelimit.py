@@ -0,0 +1,111 @@
+import threading
+import time
+
+from contextlib import contextmanager
+
+import singer
+
+LOGGER = singer.get_logger()  # noqa
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+class RateLimiter:
+    """Caps the calls made to Bronto by every session in the process.
+
+    A token bucket allows `calls_per_second` on average, with bursts of
+    up to `burst` calls. A semaphore allows at most `max_in_flight`
+    calls at once. When Bronto says we are being throttled, throttled()
+    pauses everyone and halves the rate; the rate then creeps back up
+    to the configured limit as calls succeed."""
+
+    def __init__(self, calls_per_second=None, max_in_flight=None,
+                 burst=None, min_calls_per_second=0.1):
+        self.max_rate = calls_per_second
+        self.rate = calls_per_second
+        self.min_rate = min_calls_per_second
+        self.capacity = burst or max(1.0, calls_per_second or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = threading.Lock()
+
+        self.in_flight = None
+
+        if max_in_flight:
+            self.in_flight = threading.BoundedSemaphore(max_in_flight)
+
+    def refill(self, now):
+        if self.rate is not None:
+            self.tokens = min(self.capacity,
+                              self.tokens + (now - self.updated) * self.rate)
+
+        self.updated = now
+
+    def wait_for_token(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+
+                if now < self.paused_until:
+                    delay = self.paused_until - now
+
+                elif self.rate is None or self.tokens >= 1:
+                    self.tokens = self.tokens - 1
+                    return
+
+                else:
+                    delay = (1 - self.tokens) / self.rate
+
+            time.sleep(delay)
+
+    def succeeded(self):
+        if self.rate is None or self.rate >= self.max_rate:
+            return
+
+        with self.lock:
+            # Additive increase: about one call/sec more per 10 calls.
+            self.rate = min(self.max_rate, self.rate + 0.1)
+
+    def throttled(self, delay):
+        """Pauses all calls for `delay` seconds and halves the rate."""
+        with self.lock:
+            self.paused_until = max(self.paused_until,
+                                    time.monotonic() + delay)
+
+            if self.rate is not None:
+                self.rate = max(self.min_rate, self.rate / 2)
+                LOGGER.warning('Throttled by Bronto, slowing to {:.2f} '
+                               'calls/sec.'.format(self.rate))
+
+    @contextmanager
+    def limit(self):
+        self.wait_for_token()
+
+        if self.in_flight is None:
+            yield
+            return
+
+        with self.in_flight:
+            yield
+
+
+def get_rate_limiter(config):
+    """Returns the process-wide limiter for this API token, so every
+    stream and session on the account draws on the same budget."""
+    key = config.get('api_token')
+
+    with _LIMITERS_LOCK:
+        if key not in _LIMITERS:
+            calls_per_second = config.get('api_calls_per_second')
+            burst = config.get('api_burst')
+
+            _LIMITERS[key] = RateLimiter(
+                calls_per_second=(float(calls_per_second)
+                                  if calls_per_second else None),
+                max_in_flight=int(config.get('max_concurrent_requests', 0)),
+                burst=float(burst) if burst else None)
+
+        return _LIMITERS[key]
@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import singer
+
+from tap_bronto.profiling import profile_endpoint
+
+LOGGER = singer.get_logger()  # noqa
+
+
+class SyncScheduler:
+    """Runs stream syncs on a pool of worker threads.
+
+    All streams share one BookmarkManager, so a STATE message emitted by
+    any of them carries every stream's bookmark. Output from the workers is
+    serialized through tap_bronto.output."""
+
+    def __init__(self, stream_accessors, bookmarks, max_workers=1):
+        self.stream_accessors = stream_accessors
+        self.bookmarks = bookmarks
+        self.max_workers = max(1, int(max_workers))
+
+    def sync_stream(self, stream_accessor):
+        # Outside the try, so a profiler that can't start isn't taken for
+        # a failed sync.
+        with profile_endpoint(stream_accessor.name):
+            try:
+                stream_accessor.sync()
+
+            except Exception as exception:
+                LOGGER.error(exception)
+                LOGGER.error('Failed to sync endpoint {}, moving on!'
+                             .format(stream_accessor.name))
+
+            finally:
+                if stream_accessor.dedup_filter is not None:
+                    LOGGER.info('Dropped {} unchanged {} records.'.format(
+                        stream_accessor.dedup_filter.dropped,
+                        stream_accessor.name))
+
+                stream_accessor.metrics.flush()
+                self.bookmarks.flush()
+
+    def run(self):
+        LOGGER.info('Syncing {} streams with {} workers.'
+                    .format(len(self.stream_accessors), self.max_workers))
+
+        with ThreadPoolExecutor(max_workers=self.max_workers,
+                                thread_name_prefix='sync') as executor:
+            list(executor.map(self.sync_stream, self.stream_accessors))
+
+        return self.bookmarks
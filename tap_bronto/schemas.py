@@ -1,5 +1,3 @@
-from funcy import project
-
 from datetime import datetime
 
 
@@ -15,6 +13,21 @@ def with_properties(properties):
     }
 
 
+ACCOUNT_PROPERTY = {
+    'type': ['string'],
+    'description': 'The Bronto account the record came from.',
+    'metadata': {
+        'inclusion': 'automatic',
+    },
+}
+
+
+def with_account(schema):
+    """Adds the `account` property records have in multi-account syncs."""
+    return dict(schema, properties=dict(schema['properties'],
+                                        account=ACCOUNT_PROPERTY))
+
+
 def is_selected(catalog):
     metadata = catalog.get('metadata')
 
@@ -25,26 +38,50 @@ def is_selected(catalog):
                metadata.get('selected-by-default') is True))))
 
 
-def get_field_selector(schema):
-    selections = []
+def is_string_field(field_schema):
+    types = field_schema.get('type', 'string')
 
-    for field, schema in schema.get('properties').items():
-        if is_selected(schema):
-            selections.append(field)
+    if isinstance(types, str):
+        types = [types]
 
-    def select(data):
-        to_return = {}
+    return 'string' in types
 
-        for k, v in project(data, selections).items():
-            if isinstance(v, datetime):
-                to_return[k] = v.replace(microsecond=0).isoformat()
 
-            else:
-                to_return[k] = v
+class FieldSelector:
+    """Picks the selected fields out of a record.
+
+    The selected fields are worked out once, here, rather than for every
+    record. Bronto hands back dates as datetimes and we emit them as
+    strings, so only string fields are checked for datetimes. Unlike a
+    closure, this can be sent to a transform process."""
+
+    phase = 'select'
+
+    def __init__(self, schema):
+        self.fields = tuple(field
+                            for field, field_schema
+                            in schema.get('properties').items()
+                            if is_selected(field_schema))
+
+        self.string_fields = tuple(field
+                                   for field in self.fields
+                                   if is_string_field(
+                                       schema['properties'][field]))
+
+    def __call__(self, data):
+        to_return = {k: data[k] for k in self.fields if k in data}
+
+        for k in self.string_fields:
+            v = to_return.get(k)
+
+            if isinstance(v, datetime):
+                to_return[k] = v.isoformat(timespec='seconds')
 
         return to_return
 
-    return select
+
+def get_field_selector(schema):
+    return FieldSelector(schema)
 
 
 ACTIVITY_SCHEMA = with_properties({
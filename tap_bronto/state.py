@@ -1,63 +1,223 @@
 import json
+import threading
+import time
 from dateutil.parser import parse
 
+import pytz
 import singer
 
-from voluptuous import Schema, Required
+from tap_bronto.output import flush as flush_output, write_state, \
+    OUTPUT_LOCK
+from voluptuous import Schema, Required, Optional
 
 LOGGER = singer.get_logger()
 
+# The state dict is shared by every stream in a sync, and streams may
+# run on separate threads.
+STATE_LOCK = threading.RLock()
+
 STATE_SCHEMA = Schema({
     Required('bookmarks'): {
         str: {
             Required('last_record'): str,
             Required('field'): str,
+            Optional('rewind_seconds'): int,
+            Optional('runs_since_full_rewind'): int,
+            Optional('window'): {
+                Required('start'): str,
+                Required('end'): str,
+                Optional('page'): int,
+                Optional('position'): str,
+            },
         }
     }
 })
 
+BOOKMARK_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
-def get_last_record_value_for_table(state, table):
-    to_return = state.get('bookmarks', {}) \
-                .get(table, {}) \
-                .get('last_record')
 
-    if to_return is not None:
-        to_return = parse(to_return)
+def to_utc(value):
+    """Parses `value` if it's a string. Naive datetimes are UTC."""
+    if isinstance(value, str):
+        value = parse(value)
 
-    return to_return
+    if value.tzinfo is None:
+        return pytz.utc.localize(value)
 
+    return value.astimezone(pytz.utc)
 
-def incorporate(state, table, field, value):
-    if value is None:
-        return state
 
-    new_state = state.copy()
+class BookmarkManager:
+    """Holds every stream's bookmark during a sync and decides when to
+    emit STATE.
 
-    parsed = parse(value).strftime("%Y-%m-%dT%H:%M:%SZ")
+    The state file is validated once, when it's loaded. From then on
+    bookmarks are kept as UTC datetimes and only move forward. update()
+    emits STATE once `emit_interval` seconds or `emit_records` records
+    (whichever is set and comes first) have passed since the last one.
+    Without either, it emits on every update. flush() emits anything
+    still pending.
 
-    if 'bookmarks' not in new_state:
-        new_state['bookmarks'] = {}
+    Functions added with on_emit() are called after each STATE message
+    is written, to commit anything that must not get ahead of it."""
 
-    if(new_state['bookmarks'].get(table, {}).get('last_record') is None or
-       new_state['bookmarks'].get(table, {}).get('last_record') < value):
-        new_state['bookmarks'][table] = {
-            'field': field,
-            'last_record': parsed,
-        }
+    def __init__(self, state=None, emit_interval=None, emit_records=None):
+        state = state or {}
+
+        if state:
+            STATE_SCHEMA(state)
 
-    return new_state
+        self.emit_interval = emit_interval
+        self.emit_records = emit_records
+        self.bookmarks = {}
+
+        for table, bookmark in state.get('bookmarks', {}).items():
+            self.bookmarks[table] = dict(
+                bookmark, last_record=to_utc(bookmark['last_record']))
+
+        self.listeners = []
+        self.dirty = False
+        self.records = 0
+        self.last_emit_time = time.monotonic()
+
+    @classmethod
+    def from_config(cls, state, config):
+        emit_interval = config.get('state_emit_interval_seconds', 60)
+        emit_records = config.get('state_emit_records')
+
+        return cls(
+            state,
+            emit_interval=float(emit_interval) if emit_interval else None,
+            emit_records=int(emit_records) if emit_records else None)
+
+    def get(self, table):
+        """Returns the bookmarked datetime for `table`, or None."""
+        with STATE_LOCK:
+            return self.bookmarks.get(table, {}).get('last_record')
+
+    def update(self, table, field, value, records=0):
+        """Moves `table`'s bookmark to `value` if that's later, having
+        synced `records` more records, and emits STATE if it's due."""
+        if value is not None:
+            value = to_utc(value).replace(microsecond=0)
+
+        with STATE_LOCK:
+            current = self.get(table)
+
+            if value is not None and (current is None or current < value):
+                bookmark = self.bookmarks.setdefault(table, {})
+                bookmark['field'] = field
+                bookmark['last_record'] = value
+                self.dirty = True
 
+            self.records = self.records + records
+
+            if self.due():
+                self.emit()
 
-def save_state(state):
-    if not state:
-        return
+    def get_extra(self, table, key, default=None):
+        """Returns another value kept in `table`'s bookmark."""
+        with STATE_LOCK:
+            return self.bookmarks.get(table, {}).get(key, default)
 
-    STATE_SCHEMA(state)
+    def set_extra(self, table, key, value):
+        """Keeps `value` in `table`'s bookmark, to be emitted with it,
+        or removes it if `value` is None. Only tables with a last_record
+        are emitted."""
+        with STATE_LOCK:
+            bookmark = self.bookmarks.setdefault(table, {})
 
-    LOGGER.info('Updating state.')
+            if bookmark.get(key) != value:
+                if value is None:
+                    bookmark.pop(key)
+                else:
+                    bookmark[key] = value
 
-    singer.write_state(state)
+                self.dirty = True
+
+    def namespace(self, namespace):
+        return NamespacedBookmarks(self, namespace)
+
+    def on_emit(self, listener):
+        with STATE_LOCK:
+            if listener not in self.listeners:
+                self.listeners.append(listener)
+
+    def due(self):
+        if not self.dirty:
+            return False
+
+        if self.emit_interval is None and self.emit_records is None:
+            return True
+
+        return ((self.emit_interval is not None and
+                 time.monotonic() - self.last_emit_time >=
+                 self.emit_interval) or
+                (self.emit_records is not None and
+                 self.records >= self.emit_records))
+
+    def get_state(self):
+        with STATE_LOCK:
+            return {'bookmarks': {
+                table: dict(bookmark, last_record=bookmark[
+                    'last_record'].strftime(BOOKMARK_FORMAT))
+                for table, bookmark in self.bookmarks.items()
+                if 'last_record' in bookmark
+            }}
+
+    def emit(self):
+        # Nothing can be written between the STATE message and the
+        # listeners, which may commit what it covers.
+        with STATE_LOCK, OUTPUT_LOCK:
+            if self.bookmarks:
+                LOGGER.info('Updating state.')
+
+                write_state(self.get_state())
+            else:
+                # No state to write, but the listeners still mustn't get
+                # ahead of the records written so far.
+                flush_output()
+
+            for listener in self.listeners:
+                listener()
+
+            self.dirty = False
+            self.records = 0
+            self.last_emit_time = time.monotonic()
+
+    def flush(self):
+        """Emits STATE if any bookmark moved since the last one."""
+        with STATE_LOCK:
+            if self.dirty:
+                self.emit()
+
+
+class NamespacedBookmarks:
+    """One account's view of a BookmarkManager shared by several. Its
+    tables are kept as '<namespace>:<table>', so each account's
+    bookmarks are separate but go out in the same STATE messages."""
+
+    def __init__(self, manager, namespace):
+        self.manager = manager
+        self.namespace = namespace
+
+    def key(self, table):
+        return '{}:{}'.format(self.namespace, table)
+
+    def get(self, table):
+        return self.manager.get(self.key(table))
+
+    def update(self, table, field, value, records=0):
+        self.manager.update(self.key(table), field, value, records)
+
+    def get_extra(self, table, key, default=None):
+        return self.manager.get_extra(self.key(table), key, default)
+
+    def set_extra(self, table, key, value):
+        self.manager.set_extra(self.key(table), key, value)
+
+    def __getattr__(self, name):
+        return getattr(self.manager, name)
 
 
 def load_state(filename):
@@ -2,26 +2,58 @@ import singer
 import suds
 import sys
 
-from tap_bronto.state import get_last_record_value_for_table
+from tap_bronto.client import BrontoSession
+from tap_bronto.dedup import DedupFilter, get_dedup_store
+from tap_bronto.metrics import StreamMetrics
+from tap_bronto.pages import PageFetcher
+from tap_bronto.pipeline import RecordPipeline, get_process_pool
+from tap_bronto.schemas import with_account
+from tap_bronto.state import BookmarkManager, to_utc
+from tap_bronto.windows import WindowPlanner
 from dateutil import parser
 
 
-BRONTO_WSDL = 'https://api.bronto.com/v4?wsdl'
-
 LOGGER = singer.get_logger()  # noqa
 
 
+class AccountTagger:
+    """Sets each record's `account`."""
+
+    phase = 'tag_account'
+
+    def __init__(self, account):
+        self.account = account
+
+    def __call__(self, record):
+        record['account'] = self.account
+        return record
+
+
 class Stream:
 
     TABLE = None
     KEY_PROPERTIES = []
     SCHEMA = {}
+    WINDOW_INTERVAL = None
+
+    def __init__(self, config={}, bookmarks=None, catalog=[]):
+        # Set for each account of a multi-account sync. Its records are
+        # tagged with it, and its bookmarks kept apart from the others'.
+        self.account = config.get('account')
+        self.name = (self.TABLE if self.account is None
+                     else '{}:{}'.format(self.account, self.TABLE))
 
-    def __init__(self, config={}, state={}, catalog=[]):
         self.client = None
+        self.metrics = StreamMetrics(self.name)
+        self.session = BrontoSession(config, self.metrics)
         self.config = config
-        self.state = state
+        self.bookmarks = bookmarks or BookmarkManager()
         self.catalog = catalog
+        self.dedup_filter = None
+        self.sync_start = None
+
+        if self.account is not None:
+            self.bookmarks = self.bookmarks.namespace(self.account)
 
     def get_start_date(self, table):
         LOGGER.info('Choosing start date for table {}'.format(table))
@@ -30,7 +62,7 @@ class Stream:
             '2017-01-01T00:00:00-00:00')
         default_start = parser.parse(default_start_string)
 
-        start = get_last_record_value_for_table(self.state, table)
+        start = self.bookmarks.get(table)
 
         replication_method = self.catalog.get('replication_method',
                                               'INCREMENTAL')
@@ -55,15 +87,118 @@ class Stream:
                                .format(replication_method))
         return start
 
+    def get_key_properties(self):
+        return self.catalog.get('key_properties') or self.KEY_PROPERTIES
+
+    def get_dedup_store(self):
+        path = self.config.get('dedup_store')
+
+        if path is None:
+            return None
+
+        store = get_dedup_store(self.config, path)
+        self.bookmarks.on_emit(store.commit)
+
+        return store
+
+    def get_dedup_filter(self, store):
+        return DedupFilter(store, self.name, self.get_key_properties())
+
+    def get_process_pool(self):
+        processes = int(self.config.get('transform_processes', 0))
+
+        if processes < 1:
+            return None
+
+        if self.dedup_filter is not None:
+            LOGGER.warning('The dedup store is only in this process, so '
+                           '{} records are transformed here, not in '
+                           'transform processes.'.format(self.name))
+            return None
+
+        return get_process_pool(processes)
+
+    def get_pipeline(self, transforms):
+        """With the `dedup_store` option, records that were emitted
+        before and haven't changed are dropped after `transforms`. With
+        `transform_processes`, records are transformed in that many other
+        processes."""
+        if self.account is not None:
+            transforms = transforms + [AccountTagger(self.account)]
+
+        store = self.get_dedup_store()
+
+        if store is not None:
+            self.dedup_filter = self.get_dedup_filter(store)
+            transforms = transforms + [self.dedup_filter]
+
+        return RecordPipeline(
+            self.TABLE, transforms,
+            buffer_size=self.config.get('record_buffer_size', 1000),
+            metrics=self.metrics,
+            executor=self.get_process_pool())
+
+    def get_page_fetcher(self):
+        return PageFetcher(
+            self.config,
+            concurrency=self.config.get('page_fetch_concurrency', 1),
+            metrics=self.metrics)
+
+    def get_window_planner(self):
+        return WindowPlanner.from_config(self.config, self.WINDOW_INTERVAL)
+
+    def get_windows(self, planner, start):
+        """Yields (start, end, resume) for each window from `start`.
+
+        If a previous run stopped partway through a window, that window
+        comes first, and `resume` is what save_progress() was last given
+        for it. Otherwise `resume` is {}."""
+        self.sync_start = start
+        window = self.bookmarks.get_extra(self.TABLE, 'window')
+
+        if window is not None:
+            resume = {key: value for key, value in window.items()
+                      if key not in ('start', 'end')}
+            start = to_utc(window['start'])
+            end = to_utc(window['end'])
+
+            LOGGER.info('Resuming the window from {} to {} at {}.'
+                        .format(start, end, resume))
+
+            yield start, end, resume
+
+            start = end
+
+        for window_start, window_end in planner.windows(start):
+            yield window_start, window_end, {}
+
+    def save_progress(self, field, start, end, records=0, **resume):
+        """Records how far into the window from `start` to `end` the
+        sync has got, so a later run can pick up from there. The bookmark
+        itself is moved to `start`, or to where this run started syncing
+        if that's later: a first run's window can start before
+        start_date."""
+        resume = {key: value for key, value in resume.items()
+                  if value is not None}
+
+        bookmark = to_utc(start)
+
+        if self.sync_start is not None:
+            bookmark = max(bookmark, to_utc(self.sync_start))
+
+        self.bookmarks.set_extra(self.TABLE, 'window', dict(
+            resume, start=start.isoformat(), end=end.isoformat()))
+        self.bookmarks.update(self.TABLE, field, bookmark, records=records)
+
+    def save_window(self, field, value, records=0):
+        """Moves the bookmark up to `value` once a window is done: the
+        latest replication key read in it, or None if it had nothing."""
+        self.bookmarks.set_extra(self.TABLE, 'window', None)
+        self.bookmarks.update(self.TABLE, field, value, records=records)
+
     def login(self):
         try:
-            client = suds.client.Client(BRONTO_WSDL, timeout=3600)
-            session_id = client.service.login(
-                self.config.get('api_token'))
-            session_header = client.factory.create('sessionHeader')
-            session_header.sessionId = session_id
-            client.set_options(soapheaders=session_header)
-            self.client = client
+            self.client = self.session.ensure_logged_in()
 
         except suds.WebFault:
             LOGGER.fatal("Login failed!")
@@ -75,12 +210,18 @@ class Stream:
 
     def generate_catalog(self):
         cls = self.__class__
+        key_properties = cls.KEY_PROPERTIES
+        schema = cls.SCHEMA
+
+        if self.account is not None:
+            key_properties = ['account'] + key_properties
+            schema = with_account(schema)
 
         return [{
             'tap_stream_id': cls.TABLE,
             'stream': cls.TABLE,
-            'key_properties': cls.KEY_PROPERTIES,
-            'schema': cls.SCHEMA,
+            'key_properties': key_properties,
+            'schema': schema,
             'metadata': {
                 'selected-by-default': False,
                 'inclusion': 'available',
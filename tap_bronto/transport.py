@@ -0,0 +1,173 @@
+import gzip
+import http.client
+import io
+import queue
+import threading
+import urllib.request
+
+from urllib.parse import urlsplit
+
+import singer
+
+from suds.transport import Reply, Transport, TransportError
+
+LOGGER = singer.get_logger()  # noqa
+
+# Errors that mean a kept-alive connection was closed by the server
+# while it sat in the pool. The request is safe to send again on a
+# fresh connection.
+STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.CannotSendRequest,
+    BrokenPipeError,
+    ConnectionResetError,
+)
+
+_CONNECTION_POOLS = {}
+_CONNECTION_POOLS_LOCK = threading.Lock()
+
+
+class ConnectionPool:
+    """Keeps HTTP(S) connections open between requests, asks for gzipped
+    replies, and has separate connect and read timeouts.
+
+    Idle connections are pooled per host, up to `pool_size` each. A pool
+    can be shared by any number of threads."""
+
+    def __init__(self, connect_timeout=30, read_timeout=3600, pool_size=10):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.pools = {}
+
+    def get_pool(self, key):
+        # dict.setdefault is atomic, so threads can't race two queues in.
+        return self.pools.setdefault(key, queue.LifoQueue(self.pool_size))
+
+    def connect(self, scheme, host, port):
+        if scheme == 'https':
+            connection = http.client.HTTPSConnection(
+                host, port, timeout=self.connect_timeout)
+        else:
+            connection = http.client.HTTPConnection(
+                host, port, timeout=self.connect_timeout)
+
+        connection.connect()
+        connection.sock.settimeout(self.read_timeout)
+
+        return connection
+
+    def release(self, key, connection):
+        try:
+            self.get_pool(key).put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, method, url, body=None, headers={}):
+        """Returns (status, headers, body), with the body decompressed."""
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.hostname, parts.port)
+        path = parts.path or '/'
+
+        if parts.query:
+            path = path + '?' + parts.query
+
+        headers = dict(headers)
+        headers['Accept-Encoding'] = 'gzip'
+        headers['Connection'] = 'keep-alive'
+
+        pool = self.get_pool(key)
+
+        while True:
+            try:
+                connection = pool.get_nowait()
+                reused = True
+            except queue.Empty:
+                connection = self.connect(*key)
+                reused = False
+
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+
+            except STALE_CONNECTION_ERRORS:
+                connection.close()
+
+                if reused:
+                    continue
+
+                raise
+
+            except Exception:
+                connection.close()
+                raise
+
+            if response.will_close:
+                connection.close()
+            else:
+                self.release(key, connection)
+
+            if response.getheader('Content-Encoding') == 'gzip':
+                data = gzip.decompress(data)
+
+            return response.status, dict(response.getheaders()), data
+
+
+class PooledHttpTransport(Transport):
+    """A suds transport that sends requests through a ConnectionPool.
+
+    suds links each transport to exactly one client's options, so every
+    client needs its own transport; they can share the pool."""
+
+    def __init__(self, pool):
+        Transport.__init__(self)
+        self.pool = pool
+
+    def open(self, request):
+        if urlsplit(request.url).scheme not in ('http', 'https'):
+            return urllib.request.urlopen(request.url)
+
+        status, _, data = self.pool.request('GET', request.url,
+                                       headers=request.headers)
+
+        if status != 200:
+            raise TransportError('HTTP {} fetching {}'
+                                 .format(status, request.url),
+                                 status, io.BytesIO(data))
+
+        return io.BytesIO(data)
+
+    def send(self, request):
+        headers = dict(request.headers)
+        headers['Content-Type'] = headers.get('Content-Type',
+                                              'text/xml; charset=utf-8')
+
+        status, reply_headers, data = self.pool.request(
+            'POST', request.url, body=request.message, headers=headers)
+
+        if status in (202, 204):
+            return None
+
+        if status >= 300:
+            raise TransportError('HTTP {}'.format(status),
+                                 status, io.BytesIO(data))
+
+        return Reply(status, reply_headers, data)
+
+
+def get_connection_pool(config):
+    """Returns the process-wide pool for these settings."""
+    settings = (float(config.get('http_connect_timeout', 30)),
+                float(config.get('http_read_timeout', 3600)),
+                int(config.get('http_pool_size', 10)))
+
+    with _CONNECTION_POOLS_LOCK:
+        if settings not in _CONNECTION_POOLS:
+            _CONNECTION_POOLS[settings] = ConnectionPool(*settings)
+
+        return _CONNECTION_POOLS[settings]
+
+
+def get_transport(config):
+    return PooledHttpTransport(get_connection_pool(config))
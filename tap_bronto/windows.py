@@ -0,0 +1,87 @@
+from datetime import datetime, timedelta
+
+import pytz
+import singer
+
+LOGGER = singer.get_logger()  # noqa
+
+EPOCH = datetime(1970, 1, 1, tzinfo=pytz.utc)
+
+
+class WindowPlanner:
+    """Plans the date windows a stream reads, from `start` up to now.
+
+    After each window the caller reports how many rows and API calls it
+    took, and how many of those calls timed out, via record(). Sparse
+    windows make the next one bigger, and windows that needed more than
+    `max_pages` calls or timed out make the next one smaller, always
+    within [min_interval, max_interval].
+
+    With a `granularity`, windows start on a multiple of it (counted in
+    UTC from the epoch) and are a whole number of it long, so a
+    granularity of a day makes every window whole UTC days."""
+
+    def __init__(self, interval, min_interval=timedelta(minutes=15),
+                 max_interval=timedelta(days=7), target_rows=5000,
+                 max_pages=10, granularity=None):
+        self.granularity = granularity
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.target_rows = target_rows
+        self.max_pages = max_pages
+        self.interval = self.clamp(interval)
+
+    @classmethod
+    def from_config(cls, config, interval, granularity=None):
+        return cls(
+            interval,
+            granularity=granularity,
+            min_interval=timedelta(
+                minutes=float(config.get('window_min_minutes', 15))),
+            max_interval=timedelta(
+                hours=float(config.get('window_max_hours', 168))),
+            target_rows=int(config.get('window_target_rows', 5000)),
+            max_pages=int(config.get('window_max_pages', 10)))
+
+    def clamp(self, interval):
+        interval = max(self.min_interval, min(self.max_interval, interval))
+
+        if self.granularity is not None:
+            interval = max(self.granularity,
+                           interval - interval % self.granularity)
+
+        return interval
+
+    def align(self, start):
+        """Returns the window boundary at or before `start`."""
+        if self.granularity is None:
+            return start
+
+        return start - (start - EPOCH) % self.granularity
+
+    def resize(self, factor):
+        interval = self.clamp(self.interval * factor)
+
+        if interval != self.interval:
+            LOGGER.info('Resizing window from {} to {}'
+                        .format(self.interval, interval))
+
+        self.interval = interval
+
+    def record(self, rows, calls, timeouts=0):
+        if timeouts or calls > self.max_pages:
+            self.resize(0.5)
+
+        elif rows < self.target_rows:
+            # Aim for a window that fills about `target_rows`, but never
+            # more than double at once in case this was a quiet spell.
+            self.resize(min(2.0, self.target_rows / max(rows, 1)))
+
+    def windows(self, start):
+        end = self.align(start)
+
+        while end < datetime.now(pytz.utc):
+            start = end
+            end = start + self.interval
+
+            yield start, end
@@ -0,0 +1,162 @@
+"""Fixtures that run tap-bronto in a subprocess against the fake Bronto
+service, which runs in the test process so tests can inject faults."""
+import json
+import subprocess
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks.end_to_end import TAP
+from benchmarks.fake_bronto.server import FakeBronto, FakeBrontoServer
+
+HOURS = 6
+
+# The date each stream's records are dated by in the fake service.
+DATE_FIELDS = {
+    'contact': 'modified',
+    'inbound_activity': 'createdDate',
+    'outbound_activity': 'createdDate',
+    'unsubscribe': 'created',
+}
+
+
+def parse_date(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class Run:
+    """The messages written by one run of the tap."""
+
+    def __init__(self, process):
+        self.returncode = process.returncode
+        self.stderr = process.stderr.decode('utf-8')
+        self.messages = [json.loads(line)
+                         for line in process.stdout.decode('utf-8')
+                         .splitlines()]
+
+    def records(self, stream):
+        return [message['record'] for message in self.messages
+                if message['type'] == 'RECORD' and
+                message['stream'] == stream]
+
+    @property
+    def states(self):
+        return [message['value'] for message in self.messages
+                if message['type'] == 'STATE']
+
+    @property
+    def state(self):
+        return self.states[-1] if self.states else None
+
+
+class Tap:
+    """Runs the tap with a config pointed at `server`, syncing HOURS of
+    history. Records dated from `started` on may still be arriving, so
+    tests compare only the ones dated before it."""
+
+    def __init__(self, directory, server):
+        self.directory = directory
+        self.bronto = server.bronto
+        self.started = datetime.now(timezone.utc).replace(microsecond=0)
+        self.start_date = self.started - timedelta(hours=HOURS)
+        self.config = {
+            'api_token': 'test',
+            'start_date': self.start_date.isoformat(),
+            'wsdl_url': server.wsdl_url,
+            'wsdl_cache_dir': str(directory / 'wsdl'),
+            'activity_rewind_hours': 0,
+            'retry_base_delay': 0,
+        }
+        self.catalogs = {}
+
+    def write(self, name, value):
+        path = self.directory / name
+
+        with open(path, 'w') as handle:
+            json.dump(value, handle)
+
+        return str(path)
+
+    def catalog(self, streams):
+        key = tuple(sorted(streams))
+
+        if key not in self.catalogs:
+            output = subprocess.run(
+                TAP + ['--config', self.write('config.json', self.config),
+                       '--discover'],
+                stdout=subprocess.PIPE, check=True).stdout
+            catalog = json.loads(output)
+
+            for stream in catalog['streams']:
+                stream['metadata']['selected'] = stream['stream'] in streams
+
+            self.catalogs[key] = catalog
+
+        return self.catalogs[key]
+
+    def sync(self, streams, state=None, check=True, options=(), **config):
+        """Runs a sync of `streams`, with `config` on top of the usual
+        config and `options` added to the command line. Returns its
+        Run."""
+        catalog = self.catalog(streams)
+        args = ['--config',
+                self.write('config.json', dict(self.config, **config)),
+                '--properties', self.write('catalog.json', catalog)]
+        args += list(options)
+
+        if state is not None:
+            args += ['--state', self.write('state.json', state)]
+
+        run = Run(subprocess.run(TAP + args, stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE))
+
+        if check:
+            assert run.returncode == 0, run.stderr[-2000:]
+
+        return run
+
+    def settled(self, stream, records):
+        """`records` dated before the test started."""
+        field = DATE_FIELDS[stream]
+
+        return [record for record in records
+                if parse_date(record[field]) < self.started]
+
+    def expected(self, stream, since=None):
+        """How many records of `stream` are dated from `since` (or the
+        start date) until the test started."""
+        timeline = {
+            'contact': self.bronto.contacts,
+            'inbound_activity': self.bronto.inbound,
+            'outbound_activity': self.bronto.outbound,
+            'unsubscribe': self.bronto.unsubscribes,
+        }[stream]
+
+        return len(timeline.span(since or self.start_date, self.started))
+
+
+def get_keys(records, key_properties):
+    return [tuple(record[key] for key in key_properties)
+            for record in records]
+
+
+@pytest.fixture
+def bronto():
+    return FakeBronto(contacts_per_hour=120, activities_per_hour=240,
+                      unsubscribes_per_hour=30, lists=30, page_size=100)
+
+
+@pytest.fixture
+def server(bronto):
+    server = FakeBrontoServer(bronto).start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def tap(tmp_path, server):
+    return Tap(tmp_path, server)
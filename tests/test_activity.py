@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import pytest
+
+from tap_bronto.endpoints.inbound_activity import InboundActivityStream
+from tap_bronto.state import BookmarkManager
+from tests.conftest import get_keys, parse_date
+
+STREAM = 'inbound_activity'
+OPERATION = 'readRecentInboundActivities'
+
+
+@pytest.mark.parametrize('fault', ['106: Invalid session.',
+                                   '101: Internal error.'])
+def test_fault_reading_next_page(tap, fault):
+    # The first call reads FIRST, and the rest NEXT from its cursor.
+    tap.bronto.fail(OPERATION, 3, fault)
+
+    run = tap.sync([STREAM])
+    records = tap.settled(STREAM, run.records(STREAM))
+    keys = set(get_keys(records, ['id']))
+
+    assert len(keys) == tap.expected(STREAM)
+    assert parse_date(run.state['bookmarks'][STREAM]['last_record']) == \
+        max(parse_date(record['createdDate'])
+            for record in run.records(STREAM))
+
+
+def test_failed_reads_are_retried_max_retries_times(tap):
+    for call in range(1, 10):
+        tap.bronto.fail(OPERATION, call, '101: Internal error.')
+
+    run = tap.sync([STREAM], check=False, max_retries=2)
+
+    assert run.records(STREAM) == []
+    assert tap.bronto.calls[OPERATION] == 3
+
+
+def get_rewinds(lateness, **config):
+    """Returns the rewind, in hours, of each run in turn, where run `i`
+    finds activities `lateness[i]` hours late if its rewind reaches back
+    that far."""
+    stream = InboundActivityStream(
+        config=dict(config, dedup_store='unused.sqlite'),
+        bookmarks=BookmarkManager())
+    rewinds = []
+
+    for hours in lateness:
+        rewind = stream.get_rewind(STREAM)
+        seen = timedelta(hours=hours)
+
+        stream.save_rewind(STREAM, rewind,
+                           seen if rewind >= seen else timedelta(0))
+        rewinds.append(rewind / timedelta(hours=1))
+
+    return rewinds
+
+
+def test_tuned_rewind_halves_down_to_the_minimum():
+    assert get_rewinds([0] * 4, activity_full_rewind_runs=10) == \
+        [72, 36, 24, 24]
+
+
+def test_full_rewind_finds_activities_later_than_the_tuned_rewind():
+    # From the third run on, activities turn up 40 hours late, which
+    # only a full rewind reaches.
+    assert get_rewinds([0, 0, 40, 40, 40],
+                       activity_full_rewind_runs=3) == \
+        [72, 36, 24, 72, 72]
@@ -0,0 +1,69 @@
+import io
+import json
+import sqlite3
+import threading
+
+from tap_bronto import output
+from tap_bronto.dedup import DedupFilter, DedupStore
+from tap_bronto.pipeline import RecordPipeline
+from tap_bronto.state import BookmarkManager
+
+STREAMS = ['inbound_activity', 'list', 'unsubscribe']
+
+
+def test_unchanged_records_are_dropped(tap):
+    store = str(tap.directory / 'dedup.sqlite')
+    first = tap.sync(STREAMS, dedup_store=store)
+    second = tap.sync(STREAMS, state=first.state, dedup_store=store)
+
+    assert len(first.records('list')) == tap.bronto.lists
+
+    assert second.records('list') == []
+
+    for stream in ['inbound_activity', 'unsubscribe']:
+        assert tap.settled(stream, second.records(stream)) == []
+
+
+def test_state_waits_for_filtered_records(tmp_path, monkeypatch):
+    stdout = io.BytesIO()
+    monkeypatch.setattr(output, 'WRITER', output.MessageWriter(
+        buffer_size=0, stream=stdout))
+
+    path = str(tmp_path / 'dedup.sqlite')
+    store = DedupStore(path)
+    bookmarks = BookmarkManager()
+    bookmarks.on_emit(store.commit)
+
+    filtered = threading.Event()
+    release = threading.Event()
+
+    def pause(records):
+        filtered.set()
+        release.wait(5)
+        return records
+
+    pause.batch = True
+
+    pipeline = RecordPipeline('list', [
+        DedupFilter(store, 'list', ['id']), pause])
+    writer = threading.Thread(
+        target=pipeline.emit, args=([{'id': 'list-1'}],))
+    writer.start()
+    filtered.wait(5)
+
+    # Another stream's STATE can't go out, and commit the filtered
+    # record, until the record is written.
+    emitter = threading.Thread(target=bookmarks.emit)
+    emitter.start()
+    emitter.join(0.2)
+
+    assert emitter.is_alive()
+
+    release.set()
+    writer.join(5)
+    emitter.join(5)
+
+    assert [json.loads(line)['type']
+            for line in stdout.getvalue().splitlines()] == ['RECORD']
+    assert sqlite3.connect(path).execute(
+        'SELECT key FROM records').fetchall() == [('["list-1"]',)]
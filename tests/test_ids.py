@@ -0,0 +1,16 @@
+from tap_bronto.ids import IdDeriver, ACTIVITY_ID_FIELDS
+
+
+def test_md5_ids_are_unchanged():
+    records = IdDeriver(ACTIVITY_ID_FIELDS)([{
+        'createdDate': '2017-03-01T12:00:00+00:00',
+        'activityType': 'open',
+        'contactId': 'contact-1',
+        'listId': None,
+        'segmentId': '',
+        'messageId': 'message-1',
+        'deliveryId': 'delivery-1',
+    }])
+
+    # What tap-bronto has always generated for this activity.
+    assert records[0]['id'] == '21f204f8a855312e40a100197d7b42da'
@@ -0,0 +1,28 @@
+import pytest
+
+from tests.conftest import get_keys
+
+STREAMS = ['contact', 'inbound_activity', 'unsubscribe']
+
+KEY_PROPERTIES = {
+    'contact': ['id'],
+    'inbound_activity': ['id'],
+    'unsubscribe': ['contactId', 'method', 'created'],
+}
+
+
+@pytest.mark.parametrize('fast_decoder', [False, True])
+def test_transform_processes(tap, fast_decoder):
+    in_process = tap.sync(STREAMS, fast_decoder=fast_decoder)
+    in_pool = tap.sync(STREAMS, fast_decoder=fast_decoder,
+                       transform_processes=2, record_buffer_size=50)
+
+    for stream in STREAMS:
+        def key(record):
+            return get_keys([record], KEY_PROPERTIES[stream])
+
+        expected = tap.settled(stream, in_process.records(stream))
+        actual = tap.settled(stream, in_pool.records(stream))
+
+        assert len(expected) == tap.expected(stream)
+        assert sorted(actual, key=key) == sorted(expected, key=key)
@@ -0,0 +1,46 @@
+import sys
+
+import pytest
+
+ACCOUNTS = [{'account': 'east', 'api_token': 'east'},
+            {'account': 'west', 'api_token': 'west'}]
+
+
+@pytest.mark.parametrize('mode', ['cprofile', 'sample'])
+def test_profiles_each_account(tap, mode):
+    if mode == 'cprofile' and sys.version_info >= (3, 12):
+        pytest.skip('From Python 3.12 cProfile has one profile for the run.')
+
+    path = tap.directory / 'profile.txt'
+
+    tap.sync(['list'], accounts=ACCOUNTS,
+             options=['--profile', str(path), '--profile-mode', mode])
+
+    report = path.read_text()
+
+    for account in ['east', 'west']:
+        assert '=== {}:list'.format(account) in report
+
+        if mode == 'cprofile':
+            assert (tap.directory /
+                    'profile.txt.{}:list.prof'.format(account)).exists()
+
+
+def test_cprofile_includes_stream_threads(tap):
+    path = tap.directory / 'profile.txt'
+
+    tap.sync(['inbound_activity', 'contact'], contact_window_workers=2,
+             page_fetch_concurrency=2,
+             options=['--profile', str(path)])
+
+    sections = dict(
+        section.split(' ===\n', 1)
+        for section in path.read_text().split('=== ')[1:])
+
+    if sys.version_info >= (3, 12):
+        assert list(sections) == ['all']
+        assert 'read_page' in sections['all']
+    else:
+        # Pages are read on threads of the stream's own.
+        for stream in ['inbound_activity', 'contact']:
+            assert 'read_page' in sections[stream]
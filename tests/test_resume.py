@@ -0,0 +1,39 @@
+import pytest
+
+from tests.conftest import DATE_FIELDS, get_keys, parse_date
+
+STREAMS = [
+    ('contact', 'readContacts', ['id']),
+    ('inbound_activity', 'readRecentInboundActivities', ['id']),
+    ('unsubscribe', 'readUnsubscribes', ['contactId', 'method', 'created']),
+]
+
+
+@pytest.mark.parametrize('stream, operation, key_properties', STREAMS)
+def test_resume_after_failure(tap, stream, operation, key_properties):
+    # Partway through the first window.
+    tap.bronto.fail(operation, 2, '999: Something went wrong.')
+
+    failed = tap.sync([stream], check=False, state_emit_interval_seconds=0)
+    window = failed.state['bookmarks'][stream]['window']
+    resumed = tap.sync([stream], state=failed.state)
+
+    assert parse_date(failed.state['bookmarks'][stream]['last_record']) >= \
+        tap.start_date
+    assert 'window' not in resumed.state['bookmarks'][stream]
+
+    first = tap.settled(stream, failed.records(stream))
+    second = tap.settled(stream, resumed.records(stream))
+    keys = set(get_keys(first + second, key_properties))
+
+    assert len(keys) == tap.expected(stream)
+
+    # Only the page being read when the first run failed is read again.
+    assert len(first) + len(second) - len(keys) <= tap.bronto.page_size
+
+    field = DATE_FIELDS[stream]
+
+    assert all(parse_date(record[field]) >= tap.start_date
+               for record in second)
+    assert all(parse_date(record[field]) >= parse_date(window['start'])
+               for record in second)
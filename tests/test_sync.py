@@ -0,0 +1,112 @@
+import hashlib
+
+from tap_bronto.ids import ACTIVITY_ID_FIELDS
+
+from tests.conftest import DATE_FIELDS, get_keys, parse_date
+
+STREAMS = ['contact', 'inbound_activity', 'list', 'unsubscribe']
+
+KEY_PROPERTIES = {
+    'contact': ['id'],
+    'inbound_activity': ['id'],
+    'list': ['id'],
+    'unsubscribe': ['contactId', 'method', 'created'],
+}
+
+
+def get_md5_id(record):
+    values = [record[field] for field in ACTIVITY_ID_FIELDS
+              if record.get(field)]
+
+    return hashlib.md5('|'.join(values).encode('utf-8')).hexdigest()
+
+
+def test_sync(tap):
+    run = tap.sync(STREAMS)
+
+    for stream, field in DATE_FIELDS.items():
+        if stream not in STREAMS:
+            continue
+
+        records = run.records(stream)
+        keys = get_keys(records, KEY_PROPERTIES[stream])
+
+        assert len(tap.settled(stream, records)) == tap.expected(stream)
+        assert len(set(keys)) == len(keys)
+
+        bookmark = run.state['bookmarks'][stream]
+
+        assert bookmark['field'] == field
+        assert 'window' not in bookmark
+        assert parse_date(bookmark['last_record']) == max(
+            parse_date(record[field]) for record in records)
+
+    assert len(run.records('list')) == tap.bronto.lists
+
+    for record in run.records('inbound_activity'):
+        assert record['id'] == get_md5_id(record)
+
+
+def test_bookmarks_move_forward(tap):
+    first = tap.sync(STREAMS)
+    second = tap.sync(STREAMS, state=first.state)
+
+    for stream, field in DATE_FIELDS.items():
+        if stream not in STREAMS:
+            continue
+
+        before = parse_date(first.state['bookmarks'][stream]['last_record'])
+        after = parse_date(second.state['bookmarks'][stream]['last_record'])
+
+        assert after >= before
+        assert all(parse_date(record[field]) >= before
+                   for record in second.records(stream))
+
+
+def test_fast_decoder_matches_suds(tap):
+    fast = tap.sync(STREAMS, fast_decoder=True)
+    slow = tap.sync(STREAMS, fast_decoder=False)
+
+    for stream in STREAMS:
+        if stream in DATE_FIELDS:
+            fast_records = tap.settled(stream, fast.records(stream))
+            slow_records = tap.settled(stream, slow.records(stream))
+        else:
+            fast_records = fast.records(stream)
+            slow_records = slow.records(stream)
+
+        def key(record):
+            return get_keys([record], KEY_PROPERTIES[stream])
+
+        assert sorted(fast_records, key=key) == \
+            sorted(slow_records, key=key)
+
+
+def test_concurrent_sync(tap):
+    streams = STREAMS + ['outbound_activity']
+    run = tap.sync(streams, stream_workers=5, contact_window_workers=2,
+                   page_fetch_concurrency=3)
+
+    for stream in streams:
+        if stream in DATE_FIELDS:
+            assert len(tap.settled(stream, run.records(stream))) == \
+                tap.expected(stream)
+
+    assert len(run.records('list')) == tap.bronto.lists
+
+
+def test_concurrent_accounts(tap):
+    accounts = [{'account': 'east', 'api_token': 'east'},
+                {'account': 'west', 'api_token': 'west'}]
+    run = tap.sync(STREAMS, accounts=accounts, stream_workers=3)
+
+    for account in ['east', 'west']:
+        for stream in STREAMS:
+            records = [record for record in run.records(stream)
+                       if record['account'] == account]
+
+            if stream in DATE_FIELDS:
+                assert len(tap.settled(stream, records)) == \
+                    tap.expected(stream)
+            else:
+                assert len(records) == tap.bronto.lists